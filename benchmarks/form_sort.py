@@ -0,0 +1,134 @@
+# benchmarks/form_sort.py
+"""Sorting the forms table by form number at 100k forms: presorted natural order vs a sort per query.
+
+Run from the repository root:
+
+    python -m benchmarks.form_sort [--forms 100000] [--repeat 7]
+
+The baseline is what queries did before columns were presorted: sort the
+matching positions by the lowercased form number on every request. The
+presorted natural order is built once, by the first sorted query on a
+catalog; the break-even column says after how many sorted queries that
+build has paid for itself. After an edit the order is patched rather than
+rebuilt, so the last lines time an edit and the first sorted query after it.
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, List
+
+from tax_forms.backend.form_query import FormQuery, get_query_index, run_query
+from tax_forms.backend.forms_catalog import CatalogSnapshot, diff_forms
+from tax_forms.backend.forms_store import FormRecord, compact_forms
+
+PREFIXES = ["", "CT-", "IT-", "M", "AL"]
+SUFFIXES = ["", "S", "-S", "X", "-ES"]
+
+
+def synthetic_snapshot(count: int, seed: int = 2) -> CatalogSnapshot:
+    """A catalog of count forms with about 80% distinct form numbers."""
+    rng = random.Random(seed)
+    forms = [
+        {
+            "formNumber": rng.choice(PREFIXES) + str(rng.randint(1, 9999)) + rng.choice(SUFFIXES),
+            "formName": f"Form {i}",
+            "entityType": rng.choice(["individual", "corporation"]),
+            "localityType": "state",
+            "locality": "Ohio",
+            "calculationRules": [],
+        }
+        for i in range(count)
+    ]
+    return CatalogSnapshot(1, compact_forms(forms))
+
+
+def median_ms(run: Callable[[], object], repeat: int, setup: Callable[[], object] = lambda: None) -> float:
+    timings = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--forms", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    snapshot = synthetic_snapshot(args.forms)
+    numbers = [form["formNumber"].lower() for form in snapshot.forms]
+    entity_types = [form["entityType"].lower() for form in snapshot.forms]
+
+    def old_query(entity_type: str, reverse: bool) -> List[int]:
+        positions = [p for p, value in enumerate(entity_types) if entity_type in ("all", value)]
+        return sorted(positions, key=numbers.__getitem__, reverse=reverse)
+
+    # The one-time presort on a fresh query index; building the index's
+    # lowercased columns is left out, as queries needed those before too
+    def fresh_index():
+        snapshot._derived.clear()
+        get_query_index(snapshot)
+
+    build = median_ms(lambda: get_query_index(snapshot).sort_order("form_number"), args.repeat, fresh_index)
+
+    def query(q: FormQuery) -> Callable[[], object]:
+        def run():
+            # Drop cached match lists so every run really sorts
+            get_query_index(snapshot)._results.clear()
+            run_query(snapshot, q)
+        return run
+
+    cases = [
+        ("all forms, ascending", FormQuery(sort_key="form_number")),
+        ("all forms, descending", FormQuery(sort_key="form_number", reverse=True)),
+        ("half the forms, ascending", FormQuery(entity_type="Individual", sort_key="form_number")),
+        ("half the forms, descending", FormQuery(entity_type="Individual", sort_key="form_number", reverse=True)),
+    ]
+
+    print(f"{len(numbers)} forms, {len(set(numbers))} distinct form numbers, median of {args.repeat} runs")
+    print(f"natural presort, once per snapshot: {build:8.1f} ms")
+    print(f"{'query':30} {'per-query sort':>15} {'presorted':>10} {'break-even':>11}")
+    slowest_saving = None
+    for name, q in cases:
+        old = median_ms(lambda: old_query(q.entity_type.lower(), q.reverse), args.repeat)
+        new = median_ms(query(q), args.repeat)
+        saving = old - new
+        slowest_saving = saving if slowest_saving is None else min(slowest_saving, saving)
+        queries = f"{build / saving:.0f} queries" if saving > 0 else "never"
+        print(f"{name:30} {old:12.1f} ms {new:7.1f} ms {queries:>11}")
+
+    if slowest_saving is not None and slowest_saving <= 0:
+        print("REGRESSION: a presorted query is slower than sorting per query")
+
+    # One form renumbered, as a save from the edit modal does
+    get_query_index(snapshot).sort_order("form_number")
+    edited = dict(snapshot.forms[len(snapshot.forms) // 2])
+    edited["formNumber"] = "IT-1040-X"
+    forms = list(snapshot.forms)
+    forms[len(forms) // 2] = FormRecord.from_data(edited)
+    change = diff_forms(snapshot.forms, forms)
+
+    def edit():
+        after = CatalogSnapshot(snapshot.version + 1, tuple(forms))
+        after.carry_from(snapshot, change)
+        return after
+
+    carry = median_ms(edit, args.repeat)
+    timings = []
+    for _ in range(args.repeat):
+        after = edit()
+        start = time.perf_counter()
+        run_query(after, FormQuery(sort_key="form_number"))
+        timings.append((time.perf_counter() - start) * 1000)
+    first = statistics.median(timings)
+    old = median_ms(lambda: old_query("all", False), args.repeat)
+    print(f"after one edit: carrying indexes and orders {carry:6.1f} ms, first sorted query {first:6.1f} ms "
+          f"(per-query sort {old:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/job_deadlines.py
+"""Recomputing every job's JobForm rows at 1, 2, 4 and 8 worker processes.
+
+Run from the repository root:
+
+    python -m benchmarks.job_deadlines [--jobs 100000] [--workers 1 2 4 8]
+
+Jobs are synthetic (random entity types and fiscal year ends) and go in a
+scratch database; dates come from the app's forms catalog. Before the
+worker runs, the recompute is split into the part workers share out
+(dates and row tuples) and the part this process always does alone (the
+insert), which bounds how far adding workers can help on any machine.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from tax_forms.backend.form_index import get_form_index
+from tax_forms.backend.forms_catalog import get_catalog
+from tax_forms.backend.job_deadlines import JOB_SHARD_SIZE, JobsStore, job_form_rows, recompute_job_forms
+
+
+def add_jobs(store: JobsStore, count: int, seed: int = 7):
+    rng = random.Random(seed)
+    entity_types = list(get_form_index(get_catalog().snapshot()).by_entity_type)
+    jobs = []
+    for i in range(count):
+        year, month = rng.randrange(2018, 2030), rng.randrange(1, 13)
+        end = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+        start = (end + timedelta(days=1)).replace(year=end.year - 1)
+        jobs.append((f"job{i}", start, end, rng.choice(entity_types)))
+    store.add_jobs(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--shard-size", type=int, default=JOB_SHARD_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        store = JobsStore(os.path.join(scratch, "jobs.db"))
+        add_jobs(store, args.jobs)
+        snapshot = get_catalog().snapshot()
+        jobs = store.load_jobs()
+
+        start = time.perf_counter()
+        rows = list(job_form_rows(snapshot, jobs))
+        parallel = time.perf_counter() - start
+        start = time.perf_counter()
+        count = store.replace_job_forms(None, rows)
+        serial = time.perf_counter() - start
+        share = parallel / (parallel + serial)
+        print(f"{len(jobs)} jobs, {count} rows, {os.cpu_count()} CPUs")
+        print(f"dates and rows (split across workers): {parallel:6.2f} s")
+        print(f"insert (always in this process):       {serial:6.2f} s")
+        print(f"{'workers':>7} {'seconds':>8} {'jobs/s':>9} {'rows/s':>9} {'speedup':>8} {'bound':>6}")
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            recompute_job_forms(store, workers=workers, shard_size=args.shard_size)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            # Amdahl's law for the measured split, with free process startup and transfer
+            bound = 1 / ((1 - share) + share / workers)
+            print(
+                f"{workers:7} {elapsed:8.2f} {len(jobs) / elapsed:9.0f} {count / elapsed:9.0f} "
+                f"{baseline / elapsed:7.2f}x {bound:5.2f}x"
+            )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# tax_forms/backend/catalog_file.py
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .forms_store import FORM_FIELDS, FormRecord, freeze, keep_file_mode, thaw
+
+# Compiled, memory-mappable copy of forms.json (little-endian):
+#
+#   header   magic, format version, form count, string count, array count,
+#            section offsets, sha256 of the source JSON and sha256 of
+#            everything after the header
+#   strings  (count + 1) u64 offsets into a UTF-8 blob, then the blob
+#   forms    one row of u32 references per form: key order, extra fields,
+#            then FORM_FIELDS in order
+#   arrays   a JSON index of name, dtype, shape and offset, then the raw
+#            array data, each aligned to ARRAY_ALIGNMENT
+#
+# A reference is a string id, a string id with JSON_VALUE set (the string
+# is the JSON text of a nested value) or ABSENT. Identical strings and
+# nested values are stored once, so forms sharing rules share one copy.
+#
+# The source sha256 doubles as the catalog's version stamp: every process
+# that maps a file compiled from the same forms.json agrees on it.
+MAGIC = b"TXFC"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sIIIIQQQQ32s32s")
+ROW_FIELDS = ("_keys", "_extra") + FORM_FIELDS
+
+ABSENT = 0xFFFFFFFF
+JSON_VALUE = 0x80000000
+
+# Arrays are read in place, so keep them aligned for any dtype
+ARRAY_ALIGNMENT = 16
+
+
+class CatalogFileError(Exception):
+    """Raised when a compiled catalog is missing, stale or corrupt."""
+
+
+class _StringTable:
+    """Assigns ids to strings and JSON values while writing a catalog file."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+        # Nested values are shared between records, so encode each object once
+        # (they stay alive in the records, so their ids are not reused)
+        self._json_ids: Dict[int, int] = {}
+
+    def string(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value.encode("utf-8"))
+        return string_id
+
+    def value(self, value: Any) -> int:
+        if type(value) is str:
+            return self.string(value)
+        string_id = self._json_ids.get(id(value))
+        if string_id is None:
+            string_id = self._json_ids[id(value)] = self.string(json.dumps(thaw(value))) | JSON_VALUE
+        return string_id
+
+
+def _array_section(start: int, arrays: Mapping[str, np.ndarray]) -> List[bytes]:
+    """Lay out named arrays for a section beginning at file offset start.
+
+    Offsets in the index are relative to the data, which begins at the
+    first aligned offset after the index.
+    """
+    data = [np.ascontiguousarray(value, dtype=value.dtype.newbyteorder("<")) for value in arrays.values()]
+    index = []
+    parts = []
+    offset = 0
+    for name, value in zip(arrays, data):
+        padding = -offset % ARRAY_ALIGNMENT
+        parts.append(bytes(padding))
+        offset += padding
+        index.append({"name": name, "dtype": value.dtype.str, "shape": list(value.shape), "offset": offset})
+        parts.append(value.tobytes())
+        offset += value.nbytes
+    encoded = json.dumps(index).encode("utf-8")
+    head = struct.pack("<Q", len(encoded)) + encoded
+    return [head + bytes(-(start + len(head)) % ARRAY_ALIGNMENT)] + parts
+
+
+def write_catalog_file(
+    path: str,
+    forms: Sequence[FormRecord],
+    source_sha256: bytes,
+    arrays: Optional[Mapping[str, np.ndarray]] = None,
+):
+    """Compile records (and any precomputed arrays) into a catalog file.
+
+    The file is written beside path and renamed over it, so processes that
+    have the previous file mapped keep reading it undisturbed.
+    """
+    table = _StringTable()
+    rows = array("I")
+    for form in forms:
+        fields = form.present_fields()
+        rows.append(table.value(form.key_order))
+        rows.append(table.value(form.extra) if form.extra else ABSENT)
+        for key in FORM_FIELDS:
+            rows.append(table.value(fields[key]) if key in fields else ABSENT)
+
+    offsets = array("Q", [0])
+    for string in table.strings:
+        offsets.append(offsets[-1] + len(string))
+    if sys.byteorder != "little":
+        rows.byteswap()
+        offsets.byteswap()
+    payload = [offsets.tobytes(), b"".join(table.strings), rows.tobytes()]
+
+    strings_offset = HEADER.size
+    blob_offset = strings_offset + len(payload[0])
+    forms_offset = blob_offset + len(payload[1])
+    arrays_offset = forms_offset + len(payload[2])
+    arrays = arrays or {}
+    payload.extend(_array_section(arrays_offset, arrays))
+    digest = hashlib.sha256()
+    for part in payload:
+        digest.update(part)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(forms), len(table.strings), len(arrays),
+        strings_offset, blob_offset, forms_offset, arrays_offset, source_sha256, digest.digest(),
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            keep_file_mode(f.fileno(), path)
+            f.write(header)
+            for part in payload:
+                f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class CatalogFile:
+    """A compiled catalog mapped read-only into memory.
+
+    The mapping is backed by the page cache, so every process opening the
+    same file shares one copy of its pages. Strings and nested values are
+    decoded once each, the first time a form refers to them; arrays are
+    NumPy views straight onto the mapped pages and are never copied.
+    Replacing the file on disk does not disturb an open mapping, so a
+    CatalogFile stays valid for as long as it is referenced.
+    """
+
+    def __init__(self, path: str, source_sha256: Optional[bytes] = None):
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise CatalogFileError(f"Cannot map {path}: {e}")
+
+        if len(self._map) < HEADER.size:
+            raise CatalogFileError(f"{path} is truncated")
+        (
+            magic, version, self.form_count, self.string_count, array_count,
+            strings_offset, blob_offset, forms_offset, arrays_offset, self.source_sha256, payload_sha256,
+        ) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise CatalogFileError(f"{path} is not a version {FORMAT_VERSION} catalog file")
+        if source_sha256 is not None and self.source_sha256 != source_sha256:
+            raise CatalogFileError(f"{path} was compiled from a different forms.json")
+
+        view = memoryview(self._map)
+        if hashlib.sha256(view[HEADER.size:]).digest() != payload_sha256:
+            raise CatalogFileError(f"{path} is corrupt")
+
+        self._offsets = self._numbers("Q", view[strings_offset:blob_offset])
+        self._blob = view[blob_offset:forms_offset]
+        self._rows = self._numbers("I", view[forms_offset:arrays_offset])
+        if len(self._offsets) != self.string_count + 1 or len(self._rows) != self.form_count * len(ROW_FIELDS):
+            raise CatalogFileError(f"{path} has inconsistent sections")
+
+        (index_size,) = struct.unpack_from("<Q", self._map, arrays_offset)
+        index_end = arrays_offset + 8 + index_size
+        index = json.loads(str(view[arrays_offset + 8:index_end], "utf-8"))
+        data_offset = index_end + (-index_end % ARRAY_ALIGNMENT)
+        if len(index) != array_count:
+            raise CatalogFileError(f"{path} has inconsistent sections")
+        self._arrays: Dict[str, np.ndarray] = {}
+        for entry in index:
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"], dtype=np.int64))
+            self._arrays[entry["name"]] = np.frombuffer(
+                self._map, dtype=dtype, count=count, offset=data_offset + entry["offset"]
+            ).reshape(entry["shape"])
+
+    @property
+    def stamp(self) -> str:
+        """Version stamp of the catalog: the sha256 of the forms.json it was compiled from."""
+        return self.source_sha256.hex()
+
+    @staticmethod
+    def _numbers(typecode: str, data: memoryview) -> Sequence[int]:
+        if sys.byteorder == "little":
+            return data.cast(typecode)
+        numbers = array(typecode, data.tobytes())
+        numbers.byteswap()
+        return numbers
+
+    def _strings(self) -> List[str]:
+        offsets = self._offsets
+        blob = self._blob
+        return [str(blob[offsets[i]:offsets[i + 1]], "utf-8") for i in range(self.string_count)]
+
+    def records(self) -> Tuple[FormRecord, ...]:
+        """Build every form's record from the mapped columns."""
+        strings = self._strings()
+        # Nested values decode once and are shared by every form using them
+        values: Dict[int, Any] = {ABSENT: FormRecord.MISSING}
+
+        def value(ref: int) -> Any:
+            if ref < JSON_VALUE:
+                return strings[ref]
+            resolved = values.get(ref, values)
+            if resolved is values:
+                resolved = values[ref] = freeze(json.loads(strings[ref & ~JSON_VALUE]))
+            return resolved
+
+        width = len(ROW_FIELDS)
+        refs = self._rows.tolist()
+        records = []
+        for start in range(0, len(refs), width):
+            extra_ref = refs[start + 1]
+            records.append(FormRecord.from_row(
+                value(refs[start]),
+                [value(ref) for ref in refs[start + 2:start + width]],
+                value(extra_ref) if extra_ref != ABSENT else None,
+            ))
+        return tuple(records)
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Read-only arrays stored under "prefix.name", keyed by name."""
+        start = prefix + "."
+        return {name[len(start):]: value for name, value in self._arrays.items() if name.startswith(start)}
+
+    def close(self):
+        """Unmap the file; arrays taken from it must no longer be in use."""
+        # Views into the mapping must be released before it can be closed
+        self._arrays = {}
+        for view in (self._offsets, self._blob, self._rows):
+            if isinstance(view, memoryview):
+                view.release()
+        self._offsets = self._blob = self._rows = None
+        self._map.close()
+
+
+def compiled_path(json_path: str) -> str:
+    """Where the compiled copy of a forms.json file lives (forms.catalog beside it)."""
+    return os.path.splitext(json_path)[0] + ".catalog"
+
@@ -0,0 +1,100 @@
+# tax_forms/backend/catalog_watch.py
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from .forms_catalog import FormsCatalog
+
+# How often the watcher checks forms.json (or the SQLite version) for changes
+WATCH_INTERVAL_SECONDS = 1.0
+
+
+class CatalogWatcher:
+    """Polls a catalog's store in a daemon thread and reloads it when it changes.
+
+    Edits saved by other worker processes or made to forms.json by hand
+    are picked up here rather than by the first request to notice, so the
+    reload (and the incremental index updates that come with it) happen
+    off the event loop. Coroutines waiting in wait_for_change are then
+    woken, so sessions are pushed the change instead of polling for it.
+    """
+
+    def __init__(self, catalog: FormsCatalog, interval: float = WATCH_INTERVAL_SECONDS):
+        self.catalog = catalog
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        # Stamp of the snapshot the watcher thread last saw (None before its first check)
+        self.stamp: Optional[str] = None
+        # One event per event loop with waiters, replaced after each change
+        self._changed: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+        self._changed_lock = threading.Lock()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    async def wait_for_change(self, stamp: str, timeout: float) -> bool:
+        """Wait until the catalog's stamp is no longer stamp; False if timeout passes first.
+
+        Compares against the stamp the watcher thread published, so the
+        event loop never stats, hashes or reloads the store itself.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._changed_lock:
+                changed = self._changed.get(loop)
+                if changed is None:
+                    changed = self._changed[loop] = asyncio.Event()
+            # Checked after registering, so a change in between is not missed
+            if self.stamp is not None and self.stamp != stamp:
+                return True
+            try:
+                await asyncio.wait_for(changed.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                return False
+
+    def _notify(self):
+        with self._changed_lock:
+            waiting = list(self._changed.items())
+            self._changed.clear()
+        for loop, changed in waiting:
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                # The loop has been closed
+                pass
+
+    def _run(self):
+        while True:
+            try:
+                # Cheap unless the store changed: one stat() or one query
+                snapshot = self.catalog.snapshot()
+            except Exception as e:
+                print(f"Error watching forms catalog: {e}")
+            else:
+                if snapshot.stamp != self.stamp:
+                    self.stamp = snapshot.stamp
+                    self._notify()
+            if self._stopped.wait(self.interval):
+                return
+
+
+_watchers: Dict[int, CatalogWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def watch_catalog(catalog: FormsCatalog) -> CatalogWatcher:
+    """Start watching a catalog for changes, once per process."""
+    watcher = _watchers.get(id(catalog))
+    if watcher is None:
+        with _watchers_lock:
+            watcher = _watchers.get(id(catalog))
+            if watcher is None:
+                watcher = _watchers[id(catalog)] = CatalogWatcher(catalog)
+                watcher.start()
+    return watcher
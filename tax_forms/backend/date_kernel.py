@@ -0,0 +1,127 @@
+# tax_forms/backend/date_kernel.py
+import calendar
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from .holiday_calendar import FEDERAL_CALENDAR, HolidayCalendar
+
+# Offset kinds for a resolved date rule
+NO_DATE = -1
+AFTER_BASE = 0
+AFTER_YEAR_START = 1
+
+DEFAULT_DATE_CACHE_SIZE = 8192
+
+
+def date_rule_offset(date_rule: Optional[Mapping[str, Any]], base_month: int) -> Tuple[int, int, int]:
+    """Resolve a date rule for a base month into (offset kind, months, day).
+
+    Fiscal year exceptions for the base month replace the rule's offset, and
+    their dayOfMonth (if any) replaces the rule's day.
+    """
+    if date_rule is None:
+        return NO_DATE, 0, 0
+
+    kind = AFTER_BASE
+    months_to_add = 0
+    day_of_month = date_rule.get("dayOfMonth", 15)
+
+    exception = date_rule.get("fiscalYearExceptions", {}).get(f"{base_month:02d}")
+    source = exception if exception else date_rule
+    if "monthsAfterCalculationBase" in source:
+        months_to_add = source["monthsAfterCalculationBase"]
+    elif "monthsAfterYearStart" in source:
+        months_to_add = source["monthsAfterYearStart"]
+        kind = AFTER_YEAR_START
+    if exception and "dayOfMonth" in exception:
+        day_of_month = exception["dayOfMonth"]
+
+    return kind, months_to_add, day_of_month
+
+
+def _result_date(
+    year: int,
+    month: int,
+    months_to_add: int,
+    day_of_month: int,
+    holiday_calendar: HolidayCalendar = FEDERAL_CALENDAR,
+) -> date:
+    """Add months to a reference month, clamp the day and roll to a business day."""
+    target_month = month + months_to_add
+    target_year = year + (target_month - 1) // 12
+    target_month = ((target_month - 1) % 12) + 1
+
+    # Ensure day is valid for the target month (as the batch engine clips it)
+    actual_day = min(max(day_of_month, 1), calendar.monthrange(target_year, target_month)[1])
+
+    # Adjust for weekends and holidays
+    return holiday_calendar.roll_forward(date(target_year, target_month, actual_day))
+
+
+def _offset_date(
+    kind: int,
+    months_to_add: int,
+    day_of_month: int,
+    base_year: int,
+    base_month: int,
+    tax_year: int,
+    holiday_calendar: HolidayCalendar = FEDERAL_CALENDAR,
+) -> Optional[date]:
+    """Calculate the date for a rule offset that has already been resolved."""
+    if kind == NO_DATE:
+        return None
+    if kind == AFTER_YEAR_START:
+        return _cached_result_date(tax_year, 1, months_to_add, day_of_month, holiday_calendar)
+    return _cached_result_date(base_year, base_month, months_to_add, day_of_month, holiday_calendar)
+
+
+_cached_result_date = lru_cache(maxsize=DEFAULT_DATE_CACHE_SIZE)(_result_date)
+_cached_offset_date = lru_cache(maxsize=DEFAULT_DATE_CACHE_SIZE)(_offset_date)
+
+
+def result_date(
+    year: int,
+    month: int,
+    months_to_add: int,
+    day_of_month: int,
+    holiday_calendar: HolidayCalendar = FEDERAL_CALENDAR,
+) -> date:
+    """Memoized date for months_to_add after (year, month) on day_of_month."""
+    return _cached_result_date(year, month, months_to_add, day_of_month, holiday_calendar)
+
+
+def offset_date(
+    kind: int,
+    months_to_add: int,
+    day_of_month: int,
+    base_year: int,
+    base_month: int,
+    tax_year: int,
+    holiday_calendar: HolidayCalendar = FEDERAL_CALENDAR,
+) -> Optional[date]:
+    """Memoized date for a resolved (kind, months, day) offset."""
+    return _cached_offset_date(
+        kind, months_to_add, day_of_month, base_year, base_month, tax_year, holiday_calendar
+    )
+
+
+def configure_date_cache(maxsize: Optional[int] = DEFAULT_DATE_CACHE_SIZE):
+    """Resize the date caches (None means unbounded); existing entries are dropped."""
+    global _cached_result_date, _cached_offset_date
+    _cached_result_date = lru_cache(maxsize=maxsize)(_result_date)
+    _cached_offset_date = lru_cache(maxsize=maxsize)(_offset_date)
+
+
+def clear_date_cache():
+    """Drop all cached dates and reset the counters."""
+    _cached_result_date.cache_clear()
+    _cached_offset_date.cache_clear()
+
+
+def date_cache_info() -> Dict[str, Dict[str, Optional[int]]]:
+    """Get hit/miss counters for the date caches."""
+    return {
+        name: cache.cache_info()._asdict()
+        for name, cache in (("result_date", _cached_result_date), ("offset_date", _cached_offset_date))
+    }
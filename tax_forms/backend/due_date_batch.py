@@ -0,0 +1,286 @@
+# tax_forms/backend/due_date_batch.py
+import hashlib
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .date_kernel import AFTER_YEAR_START, NO_DATE, date_rule_offset
+from .forms_catalog import CatalogSnapshot, share_derived
+from .holiday_calendar import HolidayCalendar, calendars_fingerprint, get_holiday_calendar
+from .rule_index import get_rule_index
+
+
+class BatchDueDates(NamedTuple):
+    """Due dates for N forms x M coverage periods as datetime64[D] arrays."""
+    due_dates: np.ndarray
+    extension_due_dates: np.ndarray
+    approximated: np.ndarray
+
+
+class DateRuleParams(NamedTuple):
+    """A dueDate/extensionDueDate rule resolved for each of the 12 base months."""
+    kind: np.ndarray
+    months: np.ndarray
+    day: np.ndarray
+
+
+def _compile_date_rules(rules: List[Mapping[str, Any]], key: str) -> DateRuleParams:
+    """Build (rules x 12 base months) parameter arrays for one date rule key."""
+    # Always keep one row so lookups for forms without rules stay in bounds
+    shape = (max(len(rules), 1), 12)
+    kind = np.full(shape, NO_DATE, dtype=np.int8)
+    months = np.zeros(shape, dtype=np.int64)
+    day = np.zeros(shape, dtype=np.int64)
+    for rule_id, rule in enumerate(rules):
+        date_rule = rule.get(key)
+        if date_rule is None:
+            continue
+        # Most rules have no fiscal year exceptions, so fill the row once and
+        # only resolve the months that have an exception of their own
+        kind[rule_id], months[rule_id], day[rule_id] = date_rule_offset(date_rule, 0)
+        for month_key in date_rule.get("fiscalYearExceptions", {}):
+            if month_key.isdigit() and 1 <= int(month_key) <= 12:
+                month = int(month_key)
+                kind[rule_id, month - 1], months[rule_id, month - 1], day[rule_id, month - 1] = (
+                    date_rule_offset(date_rule, month)
+                )
+    return DateRuleParams(kind, months, day)
+
+
+# Bump when BatchRuleTables changes how it compiles rules into its arrays
+BATCH_TABLES_VERSION = 1
+
+# Per-form and per-rule arrays of BatchRuleTables, as stored in a compiled catalog
+_TABLE_ARRAYS = ("offsets", "first_year", "span", "base_is_end", "calendar_ids", "flat_rule", "flat_approx")
+
+
+class BatchRuleTables:
+    """Flattened rule tables for a catalog snapshot, laid out for NumPy."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        rule_index = get_rule_index(snapshot)
+        rule_ids: Dict[int, int] = {}
+        rules: List[Mapping[str, Any]] = []
+        flat_rule: List[int] = []
+        flat_approx: List[bool] = []
+
+        count = len(snapshot.forms)
+        self.offsets = np.zeros(count, dtype=np.int64)
+        self.first_year = np.zeros(count, dtype=np.int64)
+        self.span = np.zeros(count, dtype=np.int64)
+        self.base_is_end = np.array(
+            [form.get("calculationBase", "end") == "end" for form in snapshot.forms], dtype=bool
+        )
+
+        # Forms share a handful of holiday calendars; keep one id per form
+        self.calendars: List[HolidayCalendar] = []
+        calendar_ids: Dict[int, int] = {}
+        self.calendar_ids = np.zeros(count, dtype=np.int64)
+        for form_index, form in enumerate(snapshot.forms):
+            calendar = get_holiday_calendar(form.get("localityType"), form.get("locality"))
+            calendar_id = calendar_ids.get(id(calendar))
+            if calendar_id is None:
+                calendar_id = calendar_ids[id(calendar)] = len(self.calendars)
+                self.calendars.append(calendar)
+            self.calendar_ids[form_index] = calendar_id
+
+        for form_index, table in enumerate(rule_index.tables):
+            if table is None:
+                continue
+            self.offsets[form_index] = len(flat_rule)
+            by_year = table.by_year()
+            self.first_year[form_index] = table.first_year
+            self.span[form_index] = len(by_year)
+            for rule, approximated in by_year:
+                rule_id = rule_ids.get(id(rule))
+                if rule_id is None:
+                    rule_id = rule_ids[id(rule)] = len(rules)
+                    rules.append(rule)
+                flat_rule.append(rule_id)
+                flat_approx.append(approximated)
+
+        # Sentinel entry so forms without rules can still be indexed safely
+        flat_rule.append(-1)
+        flat_approx.append(False)
+        self.flat_rule = np.array(flat_rule, dtype=np.int64)
+        self.flat_approx = np.array(flat_approx, dtype=bool)
+
+        self.due = _compile_date_rules(rules, "dueDate")
+        self.extension = _compile_date_rules(rules, "extensionDueDate")
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Every table as a named array, for storing in a compiled catalog."""
+        arrays = {name: getattr(self, name) for name in _TABLE_ARRAYS}
+        for prefix, params in (("due", self.due), ("extension", self.extension)):
+            for field, value in params._asdict().items():
+                arrays[f"{prefix}_{field}"] = value
+        # Calendars are looked up again by name (a state, or the federal calendar)
+        arrays["calendar_names"] = np.array([calendar.name for calendar in self.calendars], dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "BatchRuleTables":
+        """Rebuild tables from to_arrays() output, using the arrays in place."""
+        tables = cls.__new__(cls)
+        for name in _TABLE_ARRAYS:
+            setattr(tables, name, arrays[name])
+        tables.due = DateRuleParams(*(arrays[f"due_{field}"] for field in DateRuleParams._fields))
+        tables.extension = DateRuleParams(*(arrays[f"extension_{field}"] for field in DateRuleParams._fields))
+        tables.calendars = [get_holiday_calendar(None, str(name)) for name in arrays["calendar_names"]]
+        return tables
+
+
+def _build_batch_tables(snapshot: CatalogSnapshot) -> BatchRuleTables:
+    # Workers attached to a compiled catalog share its precomputed tables
+    arrays = snapshot.shared_arrays("batch_tables")
+    if arrays is not None:
+        return BatchRuleTables.from_arrays(arrays)
+    return BatchRuleTables(snapshot)
+
+
+def get_batch_tables(snapshot: CatalogSnapshot) -> BatchRuleTables:
+    """Get the batch tables for a snapshot, compiling them once per catalog version."""
+    return snapshot.derived("batch_tables", _build_batch_tables)
+
+
+def _batch_tables_schema() -> str:
+    """Hash of everything besides the forms that stored batch tables depend on."""
+    layout = (BATCH_TABLES_VERSION, _TABLE_ARRAYS, DateRuleParams._fields, NO_DATE, AFTER_YEAR_START)
+    return hashlib.sha256(f"{layout!r}:{calendars_fingerprint()}".encode("utf-8")).hexdigest()
+
+
+share_derived("batch_tables", lambda snapshot: get_batch_tables(snapshot).to_arrays(), _batch_tables_schema())
+
+
+def _resolve_dates(
+    params: DateRuleParams,
+    rule_ids: np.ndarray,
+    base_months: np.ndarray,
+    base_month_index: np.ndarray,
+    tax_years: np.ndarray,
+) -> np.ndarray:
+    """Apply compiled date rules element-wise, returning datetime64[D] with NaT gaps."""
+    safe_ids = np.maximum(rule_ids, 0)
+    kind = np.where(rule_ids < 0, NO_DATE, params.kind[safe_ids, base_month_index])
+    months = params.months[safe_ids, base_month_index]
+    day = params.day[safe_ids, base_month_index]
+
+    # Months since 1970-01 of the reference date, then of the target month
+    year_start_months = (tax_years - 1970) * 12
+    reference = np.where(kind == AFTER_YEAR_START, year_start_months, base_months)
+    month_start = (reference + months).astype("datetime64[M]")
+
+    first_day = month_start.astype("datetime64[D]")
+    days_in_month = ((month_start + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+    result = first_day + (np.clip(day, 1, days_in_month) - 1)
+
+    return np.where(kind == NO_DATE, np.datetime64("NaT", "D"), result)
+
+
+def _roll_forward(
+    dates: np.ndarray, calendar_ids: np.ndarray, calendars: List[HolidayCalendar]
+) -> np.ndarray:
+    """Roll dates to business days of their forms' holiday calendars.
+
+    calendar_ids broadcasts against dates (one id per row of a forms x
+    periods grid, or one per date).
+    """
+    calendar_ids = np.broadcast_to(calendar_ids, dates.shape)
+    rolled = np.empty_like(dates)
+    for calendar_id in np.unique(calendar_ids):
+        rows = calendar_ids == calendar_id
+        block = dates[rows]
+        valid = block[~np.isnat(block)]
+        if valid.size:
+            years = valid.astype("datetime64[Y]").astype(np.int64) + 1970
+            holidays = np.array(
+                calendars[calendar_id].holiday_dates(int(years.min()), int(years.max())),
+                dtype="datetime64[D]",
+            )
+        else:
+            holidays = np.array([], dtype="datetime64[D]")
+        # NaT passes through unchanged
+        rolled[rows] = np.busday_offset(block, 0, roll="forward", holidays=holidays)
+    return rolled
+
+
+def calculate_batch(
+    snapshot: CatalogSnapshot,
+    form_indexes: Optional[Sequence[int]],
+    coverage_start_dates: Sequence[Any],
+    coverage_end_dates: Sequence[Any],
+) -> BatchDueDates:
+    """Calculate due and extension dates for forms x coverage periods.
+
+    form_indexes are 0-based positions in the snapshot (None means every
+    form). Coverage dates are anything np.datetime64 accepts. Each result
+    array has shape (len(form_indexes), len(coverage periods)); periods
+    without an applicable rule or date rule are NaT.
+    """
+    if form_indexes is None:
+        forms = np.arange(len(snapshot.forms), dtype=np.int64)
+    else:
+        forms = np.asarray(form_indexes, dtype=np.int64)
+    starts = np.asarray(coverage_start_dates, dtype="datetime64[D]")
+    ends = np.asarray(coverage_end_dates, dtype="datetime64[D]")
+    return _calculate(get_batch_tables(snapshot), forms[:, None], starts[None, :], ends[None, :])
+
+
+def calculate_pairs(
+    snapshot: CatalogSnapshot,
+    form_indexes: Sequence[int],
+    coverage_start_dates: Sequence[Any],
+    coverage_end_dates: Sequence[Any],
+) -> BatchDueDates:
+    """Calculate dates for each form with its own coverage period.
+
+    For clients with different fiscal year ends: the i-th form is paired
+    with the i-th period rather than with every period, and each result
+    array has shape (len(form_indexes),).
+    """
+    forms = np.asarray(form_indexes, dtype=np.int64)
+    starts = np.asarray(coverage_start_dates, dtype="datetime64[D]")
+    ends = np.asarray(coverage_end_dates, dtype="datetime64[D]")
+    return _calculate(get_batch_tables(snapshot), forms, starts, ends)
+
+
+def _calculate(tables: BatchRuleTables, forms: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> BatchDueDates:
+    """Dates for form positions and coverage periods given as broadcastable arrays."""
+    tax_years = ends.astype("datetime64[Y]").astype(np.int64) + 1970
+
+    # Resolve the rule for every (form, tax year) from the flattened tables
+    span = tables.span[forms]
+    has_rules = span > 0
+    relative = tax_years - tables.first_year[forms]
+    flat = tables.offsets[forms] + np.clip(relative, 0, np.maximum(span - 1, 0))
+    flat = np.where(has_rules, flat, len(tables.flat_rule) - 1)
+    rule_ids = tables.flat_rule[flat]
+    approximated = has_rules & (tables.flat_approx[flat] | (relative < 0) | (relative >= span))
+
+    # Each rule has a row per fiscal year-end month, so mixed year ends are
+    # just different column lookups
+    base = np.where(tables.base_is_end[forms], ends, starts)
+    base_months = base.astype("datetime64[M]").astype(np.int64)
+    base_month_index = base_months % 12
+
+    due_dates = _resolve_dates(tables.due, rule_ids, base_months, base_month_index, tax_years)
+    extension_due_dates = _resolve_dates(tables.extension, rule_ids, base_months, base_month_index, tax_years)
+
+    calendar_ids = tables.calendar_ids[forms]
+    return BatchDueDates(
+        due_dates=_roll_forward(due_dates, calendar_ids, tables.calendars),
+        extension_due_dates=_roll_forward(extension_due_dates, calendar_ids, tables.calendars),
+        approximated=approximated,
+    )
+
+
+def calculate_years(
+    snapshot: CatalogSnapshot,
+    form_indexes: Optional[Sequence[int]],
+    tax_years: Sequence[int],
+) -> BatchDueDates:
+    """Calculate dates for calendar-year coverage across several tax years."""
+    years = np.asarray(tax_years, dtype=np.int64) - 1970
+    starts = years.astype("datetime64[Y]").astype("datetime64[D]")
+    ends = (years + 1).astype("datetime64[Y]").astype("datetime64[D]") - 1
+    return calculate_batch(snapshot, form_indexes, starts, ends)
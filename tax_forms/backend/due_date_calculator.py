@@ -0,0 +1,107 @@
+# tax_forms/backend/due_date_calculator.py
+from datetime import date
+from typing import Dict, Any, Mapping, Optional, Sequence
+
+from .due_date_batch import BatchDueDates, calculate_batch, calculate_pairs, calculate_years
+from .due_date_engine import DueDates, form_dates, get_due_date_engine
+from .form_index import get_form_index
+from .forms_repository import FormsRepository
+from .rule_index import ResolvedRule, compile_form_rules
+
+class DueDateCalculator:
+    """Calculator for determining tax form due dates."""
+
+    def __init__(self, forms_repository=None):
+        """Initialize the calculator with a forms repository."""
+        self.forms_repository = forms_repository or FormsRepository()
+
+    def calculate_dates(
+        self,
+        form_number: str,
+        entity_type: str,
+        locality_type: str,
+        locality: str,
+        coverage_start_date: date,
+        coverage_end_date: date
+    ) -> Optional[Dict[str, Any]]:
+        """Calculate due dates for a specific form and time period."""
+        # Find the form by its attributes
+        snapshot = self.forms_repository.snapshot
+        form_index = get_form_index(snapshot).find((form_number, entity_type, locality_type, locality))
+
+        if form_index is None:
+            return None
+
+        # Same engine (and compiled rules) as the forms table
+        dates = get_due_date_engine(snapshot).dates(form_index, coverage_start_date, coverage_end_date)
+        if dates is None:
+            return None
+        return self._to_result(dates)
+
+    def calculate_form_dates(
+        self,
+        form: Mapping[str, Any],
+        coverage_start_date: date,
+        coverage_end_date: date
+    ) -> Optional[Dict[str, Any]]:
+        """Calculate due dates for a form that need not be in the catalog, e.g. one being edited."""
+        resolved = self._find_applicable_rule(form, coverage_end_date.year)
+        if resolved is None:
+            return None
+        return self._calculate_form_dates(form, resolved, coverage_start_date, coverage_end_date)
+
+    def calculate_batch(
+        self,
+        form_indexes: Optional[Sequence[int]],
+        coverage_start_dates: Sequence[Any],
+        coverage_end_dates: Sequence[Any]
+    ) -> BatchDueDates:
+        """Calculate dates for many forms x coverage periods as NumPy arrays."""
+        return calculate_batch(
+            self.forms_repository.snapshot, form_indexes, coverage_start_dates, coverage_end_dates
+        )
+
+    def calculate_pairs(
+        self,
+        form_indexes: Sequence[int],
+        coverage_start_dates: Sequence[Any],
+        coverage_end_dates: Sequence[Any]
+    ) -> BatchDueDates:
+        """Calculate dates for (form, coverage period) pairs, e.g. clients with different year ends."""
+        return calculate_pairs(
+            self.forms_repository.snapshot, form_indexes, coverage_start_dates, coverage_end_dates
+        )
+
+    def calculate_years(self, form_indexes: Optional[Sequence[int]], tax_years: Sequence[int]) -> BatchDueDates:
+        """Calculate dates for calendar-year coverage over a range of tax years."""
+        return calculate_years(self.forms_repository.snapshot, form_indexes, tax_years)
+
+    def _calculate_form_dates(
+        self,
+        form: Mapping[str, Any],
+        resolved: ResolvedRule,
+        coverage_start_date: date,
+        coverage_end_date: date
+    ) -> Dict[str, Any]:
+        """Calculate dates for a form whose rule has already been resolved."""
+        return self._to_result(form_dates(form, resolved, coverage_start_date, coverage_end_date))
+
+    def _to_result(self, dates: DueDates) -> Dict[str, Any]:
+        """Convert engine dates to the calculator's result dict."""
+        result = {
+            "due_date": dates.due_date,
+            "extension_due_date": dates.extension_due_date
+        }
+
+        # Include approximated flag if the rule came from a neighbouring year
+        if dates.approximated:
+            result["approximated"] = True
+
+        return result
+
+    def _find_applicable_rule(self, form: Mapping[str, Any], tax_year: int) -> Optional[ResolvedRule]:
+        """Find the applicable rule for a specific tax year."""
+        table = compile_form_rules(form.get("calculationRules", []))
+        if table is None:
+            return None
+        return table.resolve(tax_year)
@@ -0,0 +1,161 @@
+# tax_forms/backend/due_date_engine.py
+from datetime import date
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+
+from .date_kernel import AFTER_BASE, NO_DATE, date_rule_offset, offset_date, result_date
+from .forms_catalog import CatalogSnapshot
+from .holiday_calendar import HolidayCalendar, get_holiday_calendar
+from .rule_index import ResolvedRule, get_rule_index
+
+# How due dates are shown in the table and the edit modal
+DISPLAY_FORMAT = "%m/%d/%Y"
+
+
+class DueDates(NamedTuple):
+    """Due and extension dates of a form for one coverage period."""
+    due_date: Optional[date]
+    extension_due_date: Optional[date]
+    approximated: bool
+
+
+# Offsets of a missing date rule, for every base month
+_NO_DATE_TABLE = ((NO_DATE, 0, 0),) * 12
+
+
+class CompiledDateRule:
+    """A dueDate or extensionDueDate rule resolved ahead of time for every base month.
+
+    by_month holds the (offset kind, months, day) of each fiscal year-end
+    (or start) month, with fiscal year exceptions already applied, so a
+    client with any year end needs one tuple lookup. Most rules are "N
+    months after the calculation base, on day D" with no exceptions; those
+    also keep that single offset and skip the kind dispatch.
+    """
+
+    __slots__ = ("fast", "by_month")
+
+    def __init__(self, date_rule: Optional[Mapping[str, Any]]):
+        self.fast: Optional[Tuple[int, int]] = None
+        self.by_month: Tuple[Tuple[int, int, int], ...] = _NO_DATE_TABLE
+        if date_rule is None:
+            return
+        kind, months_to_add, day_of_month = date_rule_offset(date_rule, 0)
+        if kind == AFTER_BASE and not date_rule.get("fiscalYearExceptions"):
+            self.fast = (months_to_add, day_of_month)
+            self.by_month = ((kind, months_to_add, day_of_month),) * 12
+        else:
+            self.by_month = tuple(date_rule_offset(date_rule, month) for month in range(1, 13))
+
+    def date(self, base_date: date, tax_year: int, holiday_calendar: HolidayCalendar) -> Optional[date]:
+        """The business day this rule gives for a calculation base date and tax year."""
+        if self.fast is not None:
+            return result_date(base_date.year, base_date.month, self.fast[0], self.fast[1], holiday_calendar)
+        kind, months_to_add, day_of_month = self.by_month[base_date.month - 1]
+        return offset_date(
+            kind, months_to_add, day_of_month, base_date.year, base_date.month, tax_year, holiday_calendar
+        )
+
+
+class CompiledRule:
+    """A calculation rule with its due and extension date rules compiled."""
+
+    __slots__ = ("due", "extension")
+
+    def __init__(self, rule: Mapping[str, Any]):
+        self.due = CompiledDateRule(rule.get("dueDate"))
+        self.extension = CompiledDateRule(rule.get("extensionDueDate"))
+
+    def dates(
+        self,
+        calculation_base: str,
+        coverage_start_date: date,
+        coverage_end_date: date,
+        holiday_calendar: HolidayCalendar,
+        approximated: bool = False,
+    ) -> DueDates:
+        """Dates for a coverage period, from its end (or start, for calculationBase "start")."""
+        base_date = coverage_end_date if calculation_base == "end" else coverage_start_date
+        return self.dates_from(base_date, coverage_end_date.year, holiday_calendar, approximated)
+
+    def dates_from(
+        self, base_date: date, tax_year: int, holiday_calendar: HolidayCalendar, approximated: bool = False
+    ) -> DueDates:
+        """Dates for an explicit calculation base date."""
+        return DueDates(
+            self.due.date(base_date, tax_year, holiday_calendar),
+            self.extension.date(base_date, tax_year, holiday_calendar),
+            approximated,
+        )
+
+
+def form_dates(
+    form: Mapping[str, Any],
+    resolved: ResolvedRule,
+    coverage_start_date: date,
+    coverage_end_date: date,
+) -> DueDates:
+    """Dates for a form and a rule resolved for it, compiling the rule for this call.
+
+    For forms in the catalog, DueDateEngine keeps compiled rules between calls.
+    """
+    return CompiledRule(resolved.rule).dates(
+        form.get("calculationBase", "end"),
+        coverage_start_date,
+        coverage_end_date,
+        get_holiday_calendar(form.get("localityType"), form.get("locality")),
+        resolved.approximated,
+    )
+
+
+class DueDateEngine:
+    """Due dates for the forms of a catalog snapshot, compiling each rule once.
+
+    The table, the edit modal preview and DueDateCalculator all get their
+    dates from here (or from form_dates for unsaved forms), so they agree.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self.rule_index = get_rule_index(snapshot)
+        # Keyed by id; each entry keeps its rule alive so the id stays unique
+        self._compiled: Dict[int, Tuple[Mapping[str, Any], CompiledRule]] = {}
+
+    def compiled(self, rule: Mapping[str, Any]) -> CompiledRule:
+        """The compiled form of a rule of this snapshot, compiling it on first use.
+
+        Only for the snapshot's own frozen rules: the cache is keyed by
+        identity, so a caller's dict edited later would keep its old dates.
+        Compile other rules with CompiledRule (or form_dates).
+        """
+        entry = self._compiled.get(id(rule))
+        if entry is None:
+            entry = self._compiled.setdefault(id(rule), (rule, CompiledRule(rule)))
+        return entry[1]
+
+    def dates(self, position: int, coverage_start_date: date, coverage_end_date: date) -> Optional[DueDates]:
+        """Dates for the form at a 0-based position, or None if it has no rules."""
+        resolved = self.rule_index.resolve(position, coverage_end_date.year)
+        if resolved is None:
+            return None
+        form = self.snapshot.forms[position]
+        return self.compiled(resolved.rule).dates(
+            form.get("calculationBase", "end"),
+            coverage_start_date,
+            coverage_end_date,
+            get_holiday_calendar(form.get("localityType"), form.get("locality")),
+            resolved.approximated,
+        )
+
+    def year_dates(self, position: int, tax_year: int) -> Optional[DueDates]:
+        """Dates for calendar-year coverage of a tax year."""
+        return self.dates(position, date(tax_year, 1, 1), date(tax_year, 12, 31))
+
+
+def get_due_date_engine(snapshot: CatalogSnapshot) -> DueDateEngine:
+    """Get the due date engine for a snapshot, one per catalog version."""
+    return snapshot.derived("due_date_engine", DueDateEngine)
+
+
+def format_due_date(value: Optional[date]) -> Optional[str]:
+    """A due date as shown to users, or None."""
+    return value.strftime(DISPLAY_FORMAT) if value is not None else None
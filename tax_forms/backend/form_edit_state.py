@@ -1,10 +1,18 @@
 # tax_forms/backend/form_edit_state.py
-import json
-from pathlib import Path
+import sqlite3
+from datetime import date, datetime
 from typing import Dict, List, Optional, Any
 
 import reflex as rx
 
+from .due_date_calculator import DueDateCalculator
+from .due_date_engine import format_due_date
+from .forms_catalog import get_catalog
+from .forms_repository import FormsRepository
+from .forms_store import StaleWriteError, form_fingerprint, thaw
+from .job_deadlines import get_jobs_store, recompute_form_change
+from .table_state import TableState
+
 
 class CalculationRule(rx.Base):
     """Model for calculation rules."""
@@ -21,6 +29,8 @@ class FormEditState(rx.State):
     
     # Form data
     edit_form_id: int = -1
+    # Fingerprint of the form when the modal opened, to detect concurrent edits
+    edit_fingerprint: str = ""
     form_number: str = ""
     form_name: str = ""
     entity_type: str = "individual"
@@ -38,6 +48,8 @@ class FormEditState(rx.State):
     
     # Calculation rules
     calculation_rules: List[CalculationRule] = []
+    # Tax year the rules tab previews dates for
+    preview_year: int = datetime.now().year
     
     # Available options
     entity_types: List[str] = ["individual", "corporation", "partnership", "scorp", "smllc"]
@@ -49,61 +61,91 @@ class FormEditState(rx.State):
     
     def open_edit_modal(self, form_id: int):
         """Open the edit modal with form data."""
-        # Load forms from JSON
-        json_path = Path("assets/forms.json")
-        if json_path.exists():
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-                forms = data.get("forms", [])
-                
-                if 0 <= form_id - 1 < len(forms):
-                    form = forms[form_id - 1]
-                    
-                    # Load form data
-                    self.edit_form_id = form_id
-                    self.form_number = form.get("formNumber", "")
-                    self.form_name = form.get("formName", "")
-                    self.entity_type = form.get("entityType", "individual")
-                    self.locality_type = form.get("localityType", "federal")
-                    self.locality = form.get("locality", "")
-                    self.owner = form.get("owner", "MPM")
-                    self.calculation_base = form.get("calculationBase", "end")
-                    
-                    # Check if parent form
-                    parent_form_numbers = form.get("parentFormNumbers", [])
-                    self.is_parent_form = self.form_number in parent_form_numbers
-                    if not self.is_parent_form and parent_form_numbers:
-                        self.parent_form_number = parent_form_numbers[0]
-                    else:
-                        self.parent_form_number = ""
-                    
-                    # Load extension data
-                    extension = form.get("extension", {})
-                    self.extension_form_number = extension.get("formNumber", "")
-                    self.extension_form_name = extension.get("formName", "")
-                    self.piggyback_fed = extension.get("piggybackFed", False)
-                    
-                    # Load calculation rules properly
-                    rules = form.get("calculationRules", [])
-                    self.calculation_rules = []
-                    for rule in rules:
-                        calc_rule = CalculationRule(
-                            effective_years=rule.get("effectiveYears", []),
-                            due_date=rule.get("dueDate", {}),
-                            extension_due_date=rule.get("extensionDueDate", {})
-                        )
-                        self.calculation_rules.append(calc_rule)
-                    
-                    # Get available parent forms
-                    self.parent_forms = [
-                        f.get("formNumber", "") 
-                        for f in forms 
-                        if f.get("formNumber") != self.form_number
-                    ]
-                    
-                    self.show_edit_modal = True
-                    self.error_message = ""
+        # Load forms from the shared catalog
+        forms = get_catalog().snapshot().forms
+        if 0 <= form_id - 1 < len(forms):
+            form = forms[form_id - 1]
+            
+            # Load form data
+            self.edit_form_id = form_id
+            self.edit_fingerprint = form_fingerprint(form)
+            self.form_number = form.get("formNumber", "")
+            self.form_name = form.get("formName", "")
+            self.entity_type = form.get("entityType", "individual")
+            self.locality_type = form.get("localityType", "federal")
+            self.locality = form.get("locality", "")
+            self.owner = form.get("owner", "MPM")
+            self.calculation_base = form.get("calculationBase", "end")
+            
+            # Check if parent form
+            parent_form_numbers = form.get("parentFormNumbers", [])
+            self.is_parent_form = self.form_number in parent_form_numbers
+            if not self.is_parent_form and parent_form_numbers:
+                self.parent_form_number = parent_form_numbers[0]
+            else:
+                self.parent_form_number = ""
+            
+            # Load extension data
+            extension = form.get("extension", {})
+            self.extension_form_number = extension.get("formNumber", "")
+            self.extension_form_name = extension.get("formName", "")
+            self.piggyback_fed = extension.get("piggybackFed", False)
+            
+            # Load calculation rules properly
+            rules = form.get("calculationRules", [])
+            self.calculation_rules = []
+            for rule in rules:
+                calc_rule = CalculationRule(
+                    effective_years=thaw(rule.get("effectiveYears", [])),
+                    due_date=thaw(rule.get("dueDate", {})),
+                    extension_due_date=thaw(rule.get("extensionDueDate", {}))
+                )
+                self.calculation_rules.append(calc_rule)
+            
+            # Get available parent forms
+            self.parent_forms = [
+                f.get("formNumber", "") 
+                for f in forms 
+                if f.get("formNumber") != self.form_number
+            ]
+            
+            self.show_edit_modal = True
+            self.error_message = ""
     
+    @rx.var
+    def due_date_preview(self) -> str:
+        """Dates the rules being edited give for the preview year, before saving."""
+        form = {
+            "calculationBase": self.calculation_base,
+            "localityType": self.locality_type,
+            "locality": self.locality,
+            "calculationRules": self._rules_data(),
+        }
+        dates = DueDateCalculator().calculate_form_dates(
+            form, date(self.preview_year, 1, 1), date(self.preview_year, 12, 31)
+        )
+        if dates is None:
+            return f"No rules for {self.preview_year}"
+        preview = (
+            f"{self.preview_year}: due {format_due_date(dates['due_date']) or '-'}, "
+            f"extension {format_due_date(dates['extension_due_date']) or '-'}"
+        )
+        return preview + " (closest year)" if dates.get("approximated") else preview
+
+    def _rules_data(self) -> List[Dict[str, Any]]:
+        """Convert CalculationRule objects back to dicts."""
+        rules_data = []
+        for rule in self.calculation_rules:
+            rule_data = {"effectiveYears": rule.effective_years}
+            # A rule without an extension is edited as {}; an empty date rule
+            # would still produce a date, so leave it out
+            if rule.due_date:
+                rule_data["dueDate"] = rule.due_date
+            if rule.extension_due_date:
+                rule_data["extensionDueDate"] = rule.extension_due_date
+            rules_data.append(rule_data)
+        return rules_data
+
     def close_modal(self):
         """Close the modal without saving."""
         self.show_edit_modal = False
@@ -117,24 +159,15 @@ class FormEditState(rx.State):
             return rx.toast.error("Form number and name are required.")
         
         # Load current data
-        json_path = Path("assets/forms.json")
-        if not json_path.exists():
+        repository = FormsRepository()
+        snapshot = repository.snapshot
+        if not snapshot.forms:
             self.error_message = "Forms data file not found."
             return rx.toast.error("Forms data file not found.")
         
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-            forms = data.get("forms", [])
-        
-        if 0 <= self.edit_form_id - 1 < len(forms):
-            # Convert CalculationRule objects back to dicts
-            rules_data = []
-            for rule in self.calculation_rules:
-                rules_data.append({
-                    "effectiveYears": rule.effective_years,
-                    "dueDate": rule.due_date,
-                    "extensionDueDate": rule.extension_due_date
-                })
+        old_form = snapshot.get_form(self.edit_form_id)
+        if old_form is not None:
+            rules_data = self._rules_data()
             
             # Update form data
             form = {
@@ -157,18 +190,43 @@ class FormEditState(rx.State):
                     "piggybackFed": self.piggyback_fed
                 }
             
-            # Update form in array
-            forms[self.edit_form_id - 1] = form
-            
-            # Save to JSON file
-            with open(json_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Save just this form through the shared catalog, unless someone
+            # else changed it after the modal was opened
+            try:
+                saved = repository.update_form(
+                    self.edit_form_id, form, expected_fingerprint=self.edit_fingerprint or None
+                )
+            except StaleWriteError:
+                self.error_message = (
+                    "This form was changed by someone else. Close and reopen it to edit the latest version."
+                )
+                return rx.toast.error("This form was changed by someone else.")
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error saving form: {e}")
+                self.error_message = f"The form could not be saved: {e}"
+                return rx.toast.error("The form could not be saved.")
+            if saved is None:
+                # Deleted by someone else while the modal was open
+                self.error_message = "This form no longer exists. Close the editor to see the current forms."
+                return rx.toast.error("This form no longer exists.")
             
             # Close modal and refresh table
             self.show_edit_modal = False
             
-            # Trigger table reload
-            return rx.toast.success("Form saved successfully!", position="top-right")
+            # Recompute only the client deadlines this edit can move
+            message = "Form saved successfully!"
+            jobs_store = get_jobs_store()
+            if jobs_store is not None:
+                try:
+                    changes = recompute_form_change(jobs_store, old_form, self.edit_form_id - 1)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Error updating job deadlines: {e}")
+                else:
+                    if changes:
+                        message += f" {len(changes)} client deadlines changed."
+            
+            # Show the edit in the table
+            return [rx.toast.success(message, position="top-right"), TableState.refresh_catalog]
     
     # Rule management methods
     def add_calculation_rule(self):
@@ -221,9 +279,12 @@ class FormEditState(rx.State):
         def _update():
             if 0 <= index < len(self.calculation_rules):
                 try:
-                    self.calculation_rules[index].due_date["dayOfMonth"] = int(day)
+                    day_of_month = int(day)
                 except ValueError:
-                    pass
+                    return
+                # Days start at 1; the last day of short months is clamped when dates are computed
+                if day_of_month >= 1:
+                    self.calculation_rules[index].due_date["dayOfMonth"] = day_of_month
         return _update
     
     def update_extension_months(self, index: int, months: str):
@@ -241,7 +302,9 @@ class FormEditState(rx.State):
         def _update():
             if 0 <= index < len(self.calculation_rules):
                 try:
-                    self.calculation_rules[index].extension_due_date["dayOfMonth"] = int(day)
+                    day_of_month = int(day)
                 except ValueError:
-                    pass
+                    return
+                if day_of_month >= 1:
+                    self.calculation_rules[index].extension_due_date["dayOfMonth"] = day_of_month
         return _update
\ No newline at end of file
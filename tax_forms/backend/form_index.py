@@ -0,0 +1,143 @@
+# tax_forms/backend/form_index.py
+import json
+from bisect import insort
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+from .forms_catalog import SMALL_CHANGE, CatalogChange, CatalogSnapshot, carry_derived
+
+FormKey = Tuple[str, str, str, str]
+
+
+def form_key(form: Mapping[str, Any]) -> FormKey:
+    """Identify a form by (formNumber, entityType, localityType, locality)."""
+    return (
+        form.get("formNumber"),
+        form.get("entityType"),
+        form.get("localityType"),
+        form.get("locality"),
+    )
+
+
+def form_key_id(form: Mapping[str, Any]) -> str:
+    """form_key as text: an ID that survives other forms being added or deleted."""
+    return json.dumps(form_key(form))
+
+
+def parse_form_key_id(key_id: str) -> FormKey:
+    return tuple(json.loads(key_id))
+
+
+class FormIndex:
+    """Hash indexes from form attributes to 0-based positions in a snapshot.
+
+    Every bucket is kept in ascending position order so the first entry is
+    the form a linear scan would have found first. Indexes are shared by
+    every reader of a snapshot, so the update methods return a new index and
+    only copy the buckets they touch.
+    """
+
+    __slots__ = ("by_key", "by_number", "by_entity_type", "by_locality")
+
+    def __init__(self, forms: Iterable[Mapping[str, Any]] = ()):
+        self.by_key: Dict[FormKey, List[int]] = {}
+        self.by_number: Dict[str, List[int]] = {}
+        self.by_entity_type: Dict[str, List[int]] = {}
+        self.by_locality: Dict[str, List[int]] = {}
+        for position, form in enumerate(forms):
+            for index, key in self._keys(form):
+                index.setdefault(key, []).append(position)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: CatalogSnapshot) -> "FormIndex":
+        return cls(snapshot.forms)
+
+    def _keys(self, form: Mapping[str, Any]) -> Tuple[Tuple[Dict[Hashable, List[int]], Hashable], ...]:
+        return (
+            (self.by_key, form_key(form)),
+            (self.by_number, form.get("formNumber")),
+            (self.by_entity_type, form.get("entityType")),
+            (self.by_locality, form.get("locality")),
+        )
+
+    def _copy(self) -> "FormIndex":
+        clone = FormIndex.__new__(FormIndex)
+        clone.by_key = dict(self.by_key)
+        clone.by_number = dict(self.by_number)
+        clone.by_entity_type = dict(self.by_entity_type)
+        clone.by_locality = dict(self.by_locality)
+        return clone
+
+    def find(self, key: FormKey) -> Optional[int]:
+        """Get the position of the first form with this key."""
+        positions = self.by_key.get(key)
+        return positions[0] if positions else None
+
+    def with_added(self, position: int, form: Mapping[str, Any]) -> "FormIndex":
+        """Index a form inserted at position (normally the end of the catalog)."""
+        clone = self._copy()
+        for index, key in clone._keys(form):
+            bucket = list(index.get(key, ()))
+            insort(bucket, position)
+            index[key] = bucket
+        return clone
+
+    def with_updated(
+        self, position: int, old_form: Mapping[str, Any], new_form: Mapping[str, Any]
+    ) -> "FormIndex":
+        """Move a form's position from its old attribute buckets to its new ones."""
+        clone = self._copy()
+        for (index, old_key), (_, new_key) in zip(clone._keys(old_form), clone._keys(new_form)):
+            if old_key == new_key:
+                continue
+            clone._discard(index, old_key, position)
+            bucket = list(index.get(new_key, ()))
+            insort(bucket, position)
+            index[new_key] = bucket
+        return clone
+
+    def with_deleted(self, position: int, form: Mapping[str, Any]) -> "FormIndex":
+        """Drop a form and shift the positions of the forms after it down by one.
+
+        Form IDs are positions, so a delete renumbers every later form; the
+        shift touches each bucket once but does not rehash any keys.
+        """
+        clone = self._copy()
+        for index, key in clone._keys(form):
+            clone._discard(index, key, position)
+        for index in (clone.by_key, clone.by_number, clone.by_entity_type, clone.by_locality):
+            for key, bucket in index.items():
+                if bucket and bucket[-1] > position:
+                    index[key] = [p - 1 if p > position else p for p in bucket]
+        return clone
+
+    @staticmethod
+    def _discard(index: Dict[Hashable, List[int]], key: Hashable, position: int):
+        bucket = [p for p in index.get(key, ()) if p != position]
+        if bucket:
+            index[key] = bucket
+        else:
+            index.pop(key, None)
+
+
+def get_form_index(snapshot: CatalogSnapshot) -> FormIndex:
+    """Get the attribute indexes for a snapshot, building them once per catalog version."""
+    return snapshot.derived("form_index", FormIndex.from_snapshot)
+
+
+def _carry_form_index(
+    index: FormIndex, previous: CatalogSnapshot, snapshot: CatalogSnapshot, change: CatalogChange
+) -> Optional[FormIndex]:
+    """Patch the previous index for an edit made outside this process, if it is small."""
+    start, old_stop, new_stop = change
+    if change.shift == 0 and change.size <= SMALL_CHANGE:
+        for position in range(start, old_stop):
+            index = index.with_updated(position, previous.forms[position], snapshot.forms[position])
+        return index
+    if (old_stop - start, new_stop - start) == (0, 1) and start == len(previous.forms):
+        return index.with_added(start, snapshot.forms[start])
+    if (old_stop - start, new_stop - start) == (1, 0):
+        return index.with_deleted(start, previous.forms[start])
+    return None
+
+
+carry_derived("form_index", _carry_form_index)
@@ -0,0 +1,361 @@
+# tax_forms/backend/form_query.py
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
+from itertools import compress
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .due_date_batch import calculate_years
+from .due_date_engine import get_due_date_engine
+from .forms_catalog import SMALL_CHANGE, CatalogChange, CatalogSnapshot, carry_derived
+from .search_index import SearchIndex
+
+# Table columns and the catalog fields behind them
+FIELDS: Dict[str, str] = {
+    "form_number": "formNumber",
+    "form_name": "formName",
+    "entity_type": "entityType",
+    "locality_type": "localityType",
+    "locality": "locality",
+}
+
+# Date columns, sorted by the dates for the query's tax year
+DATE_COLUMNS: Dict[str, str] = {
+    "due_date": "due_dates",
+    "extension_due_date": "extension_due_dates",
+}
+
+# Below 1/SUBSET_SORT_RATIO of the catalog, sorting the matches by rank beats
+# walking the whole presorted permutation
+SUBSET_SORT_RATIO = 8
+
+# How many filtered and sorted position lists each snapshot keeps for paging
+RESULT_CACHE_SIZE = 64
+
+# How many raw search results each snapshot keeps for narrowing the next query
+SEARCH_CACHE_SIZE = 32
+
+# Date sort keys count days from here, as datetime64[D] values do
+_EPOCH = date(1970, 1, 1)
+
+
+_DIGITS = re.compile(r"\d+")
+
+
+def _encode_digits(match: "re.Match") -> str:
+    digits = match.group().lstrip("0") or "0"
+    # A length prefix makes longer numbers sort after shorter ones
+    return chr(len(digits)) + digits
+
+
+def natural_key(value: str) -> str:
+    """Sort key ordering digit runs by value, so "100" < "1040" < "1120" < "1120-S".
+
+    Digit runs become a control character holding their length followed by
+    the digits, which keeps the key a plain string that compares in C.
+    """
+    return _DIGITS.sub(_encode_digits, value.casefold())
+
+
+def column_sort_key(column: str) -> Callable[[str], Any]:
+    """How a text column's values compare: form numbers naturally, the rest casefolded."""
+    return natural_key if column == "form_number" else str.casefold
+
+
+class FormQuery(NamedTuple):
+    """A filter, search, sort and page request against the forms catalog."""
+    search: str = ""
+    entity_type: str = "All"
+    sort_key: str = ""
+    reverse: bool = False
+    offset: int = 0
+    limit: int = 25
+    exclude: FrozenSet[int] = frozenset()
+    # Tax year for sorting by a date column
+    year: int = 0
+
+
+class QueryResult(NamedTuple):
+    """Positions of the forms on the requested page, plus the total match count."""
+    positions: List[int]
+    total: int
+
+
+def _positions(order: Sequence[int]) -> array:
+    """Catalog positions as a compact array, copying NumPy results in one step."""
+    if isinstance(order, np.ndarray):
+        return array("I", order.astype(np.uintc).tobytes())
+    return array("I", order)
+
+
+def _without(order: array, start: int, stop: int, shift: int) -> Tuple[array, List[bool]]:
+    """order minus positions start:stop, later positions moved by shift; also which entries were kept."""
+    positions = np.frombuffer(order, dtype=np.uintc).astype(np.int64)
+    keep = (positions < start) | (positions >= stop)
+    positions = positions[keep]
+    positions[positions >= stop] += shift
+    return _positions(positions), keep.tolist()
+
+
+class SortOrder:
+    """A column's presorted permutations of catalog positions, in both directions."""
+
+    __slots__ = ("ascending", "descending", "keys", "_ranks")
+
+    def __init__(self, ascending: Sequence[int], descending: Sequence[int], keys: Optional[List[Any]] = None):
+        self.ascending = _positions(ascending)
+        self.descending = _positions(descending)
+        # keys[i] is the sort key of ascending[i], for placing edited forms
+        # (None if the order is rebuilt rather than patched). Entries past
+        # the last key have none and come last in both directions, in
+        # catalog order: forms without a date.
+        self.keys = keys
+        self._ranks: Dict[bool, array] = {}
+
+    @classmethod
+    def from_values(cls, values: Sequence[str], sort_key: Callable[[str], Any]) -> "SortOrder":
+        """Presort positions by sort_key(value); equal keys stay in catalog order both ways.
+
+        Keys are computed and compared once per distinct value, then every
+        position is ordered by the integer code of its value.
+        """
+        codes: Dict[str, int] = {}
+        ordered_keys: List[Any] = []
+        for key, value in sorted((sort_key(value), value) for value in set(values)):
+            if not ordered_keys or key != ordered_keys[-1]:
+                ordered_keys.append(key)
+            codes[value] = len(ordered_keys) - 1
+        ranked = np.fromiter((codes[value] for value in values), dtype=np.int64, count=len(values))
+        ascending = np.argsort(ranked, kind="stable")
+        keys = np.array(ordered_keys, dtype=object)[ranked[ascending]].tolist()
+        return cls(ascending, np.argsort(-ranked, kind="stable"), keys)
+
+    def with_change(self, change: CatalogChange, new_keys: Sequence[Any]) -> "SortOrder":
+        """This order after change, given the sort keys of the forms now at start:new_stop (None: last).
+
+        Replaced forms are dropped, later ones renumbered, and each new form
+        is bisected into place, so an edit costs a few array copies instead
+        of sorting the catalog again.
+        """
+        start, old_stop, _ = change
+        ascending, keep = _without(self.ascending, start, old_stop, change.shift)
+        descending, _ = _without(self.descending, start, old_stop, change.shift)
+        keys = list(compress(self.keys, keep[:len(self.keys)]))
+        for position, key in enumerate(new_keys, start):
+            if key is None:
+                ascending.insert(bisect_left(ascending, position, len(keys)), position)
+                descending.insert(bisect_left(descending, position, len(keys)), position)
+                continue
+            lo = bisect_left(keys, key)
+            hi = bisect_right(keys, key, lo)
+            # Equal keys stay in catalog order; in the descending order the
+            # same run follows every larger key
+            at = bisect_left(ascending, position, lo, hi)
+            descending.insert(len(keys) - hi + at - lo, position)
+            ascending.insert(at, position)
+            keys.insert(at, key)
+        return SortOrder(ascending, descending, keys)
+
+    def _rank(self, reverse: bool) -> array:
+        ranks = self._ranks.get(reverse)
+        if ranks is None:
+            order = self.descending if reverse else self.ascending
+            ranks = array("I", bytes(4 * len(order)))
+            for rank, position in enumerate(order):
+                ranks[position] = rank
+            self._ranks[reverse] = ranks
+        return ranks
+
+    def apply(self, positions: Sequence[int], reverse: bool) -> List[int]:
+        """Sort a subset of catalog positions by this column."""
+        order = self.descending if reverse else self.ascending
+        if len(positions) == len(order):
+            return list(order)
+        if len(positions) * SUBSET_SORT_RATIO < len(order):
+            return sorted(positions, key=self._rank(reverse).__getitem__)
+        selected = bytearray(len(order))
+        for position in positions:
+            selected[position] = 1
+        return [position for position in order if selected[position]]
+
+
+class FormQueryIndex:
+    """Lowercased catalog columns shared by every session querying a snapshot.
+
+    The full match list for a (search, filter, sort) combination is cached,
+    so turning pages only slices it. Searches go through an n-gram index
+    built the first time anyone searches this snapshot, and a query that
+    extends a recent one (the next keystroke) only rescans its matches.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot, columns: Optional[Dict[str, Tuple[str, ...]]] = None):
+        self.snapshot = snapshot
+        self.size = len(snapshot.forms)
+        self.columns: Dict[str, Tuple[str, ...]] = columns or {
+            column: self._column(field, snapshot.forms) for column, field in FIELDS.items()
+        }
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[Tuple, List[int]]" = OrderedDict()
+        self._search_index: Optional[SearchIndex] = None
+        self._searches: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._orders: Dict[Tuple[str, int], SortOrder] = {}
+
+    @staticmethod
+    def _column(field: str, forms: Sequence) -> Tuple[str, ...]:
+        return tuple(str(form.get(field, "")).lower() for form in forms)
+
+    def with_change(self, snapshot: CatalogSnapshot, change: CatalogChange) -> "FormQueryIndex":
+        """Columns and sort orders for snapshot, redoing only the changed forms.
+
+        Result and search caches start empty. Sort orders are patched when
+        the change is small, so the first sorted query after an edit does
+        not sort the whole catalog again.
+        """
+        start, old_stop, new_stop = change
+        changed = snapshot.forms[start:new_stop]
+        index = FormQueryIndex(snapshot, {
+            column: values[:start] + self._column(FIELDS[column], changed) + values[old_stop:]
+            for column, values in self.columns.items()
+        })
+        if change.size <= SMALL_CHANGE:
+            for (column, year), order in list(self._orders.items()):
+                if order.keys is None:
+                    continue
+                if column in DATE_COLUMNS:
+                    keys = self._date_keys(snapshot, column, year, range(start, new_stop))
+                else:
+                    sort_key = column_sort_key(column)
+                    keys = [sort_key(str(form.get(FIELDS[column], ""))) for form in changed]
+                index._orders[(column, year)] = order.with_change(change, keys)
+        return index
+
+    @property
+    def search_index(self) -> SearchIndex:
+        if self._search_index is None:
+            with self._lock:
+                if self._search_index is None:
+                    self._search_index = SearchIndex(tuple(self.columns.values()))
+        return self._search_index
+
+    def sort_order(self, column: str, year: int = 0) -> SortOrder:
+        """Get a column's presorted permutations (date columns are per tax year)."""
+        key = (column, year if column in DATE_COLUMNS else 0)
+        order = self._orders.get(key)
+        if order is None:
+            if column in DATE_COLUMNS:
+                order = self._date_order(DATE_COLUMNS[column], year)
+            else:
+                field = FIELDS[column]
+                order = SortOrder.from_values(
+                    [str(form.get(field, "")) for form in self.snapshot.forms], column_sort_key(column)
+                )
+            order = self._orders.setdefault(key, order)
+        return order
+
+    def _date_order(self, dates_field: str, year: int) -> SortOrder:
+        dates = getattr(calculate_years(self.snapshot, None, [year]), dates_field)[:, 0]
+        # Forms without a date sort after every dated form, in both directions
+        undated = np.isnat(dates)
+        dated = np.flatnonzero(~undated)
+        last = np.flatnonzero(undated)
+        keys = dates[dated].astype(np.int64)
+        ascending = np.argsort(keys, kind="stable")
+        return SortOrder(
+            np.concatenate([dated[ascending], last]),
+            np.concatenate([dated[np.argsort(-keys, kind="stable")], last]),
+            keys[ascending].tolist(),
+        )
+
+    @staticmethod
+    def _date_keys(snapshot: CatalogSnapshot, column: str, year: int, positions: Sequence[int]) -> List[Optional[int]]:
+        """Sort keys of a date column for a few forms (None without a date), skipping the batch tables."""
+        engine = get_due_date_engine(snapshot)
+        keys: List[Optional[int]] = []
+        for position in positions:
+            dates = engine.year_dates(position, year)
+            value = getattr(dates, column) if dates is not None else None
+            keys.append((value - _EPOCH).days if value is not None else None)
+        return keys
+
+    def matches(self, query: FormQuery) -> List[int]:
+        """Get the positions of every form matching a query, in display order."""
+        year = query.year if query.sort_key in DATE_COLUMNS else 0
+        key = (query.search.lower(), query.entity_type.lower(), query.sort_key, query.reverse, query.exclude, year)
+        with self._lock:
+            positions = self._results.get(key)
+            if positions is not None:
+                self._results.move_to_end(key)
+                return positions
+
+        positions = self._match(*key)
+        with self._lock:
+            self._results[key] = positions
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return positions
+
+    def search(self, search: str) -> List[int]:
+        """Positions of forms matching a search, in catalog order."""
+        with self._lock:
+            positions = self._searches.get(search)
+            if positions is not None:
+                self._searches.move_to_end(search)
+                return positions
+            # Narrow the longest recent query this one contains
+            narrowed = max(
+                (cached for cached in self._searches if cached in search), key=len, default=None
+            )
+            within = self._searches[narrowed] if narrowed is not None else None
+
+        positions = self.search_index.substring(search, within)
+        with self._lock:
+            self._searches[search] = positions
+            if len(self._searches) > SEARCH_CACHE_SIZE:
+                self._searches.popitem(last=False)
+        return positions
+
+    def _match(
+        self, search: str, entity_type: str, sort_key: str, reverse: bool, exclude: FrozenSet[int], year: int
+    ) -> List[int]:
+        sortable = sort_key in FIELDS or sort_key in DATE_COLUMNS
+        # Search results come best match first unless a sort column is chosen
+        if search:
+            positions = self.search(search)
+            if not sortable:
+                positions = sorted(positions, key=self.search_index.ranker(search))
+        else:
+            positions = range(self.size)
+
+        if exclude:
+            positions = [position for position in positions if position not in exclude]
+
+        # Filter by entity type
+        if entity_type != "all":
+            entity_types = self.columns["entity_type"]
+            positions = [position for position in positions if entity_types[position] == entity_type]
+
+        # Sort items
+        if sortable:
+            return self.sort_order(sort_key, year).apply(positions, reverse)
+
+        return list(positions)
+
+
+def get_query_index(snapshot: CatalogSnapshot) -> FormQueryIndex:
+    """Get the query columns for a snapshot, building them once per catalog version."""
+    return snapshot.derived("query_index", FormQueryIndex)
+
+
+carry_derived("query_index", lambda index, previous, snapshot, change: index.with_change(snapshot, change))
+
+
+def run_query(snapshot: CatalogSnapshot, query: FormQuery) -> QueryResult:
+    """Filter, search and sort the catalog, returning one page of positions."""
+    positions = get_query_index(snapshot).matches(query)
+    offset = max(query.offset, 0)
+    return QueryResult(positions[offset:offset + query.limit], len(positions))
@@ -0,0 +1,352 @@
+# tax_forms/backend/forms_catalog.py
+import os
+import threading
+from typing import Any, Callable, Dict, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .catalog_file import CatalogFile, CatalogFileError, compiled_path, write_catalog_file
+from .forms_store import (
+    FormChange, JsonFormsStore, StaleWriteError, compact_forms, default_store, file_sha256, thaw
+)
+
+# Derived structures stored as arrays in the compiled catalog, so worker
+# processes map one shared copy instead of each building their own
+_shared_builders: Dict[str, Tuple[Callable[["CatalogSnapshot"], Dict[str, np.ndarray]], str]] = {}
+
+# Stored beside each key's arrays: the schema they were built under
+SCHEMA_ARRAY = "__schema__"
+
+
+def share_derived(key: str, to_arrays: Callable[["CatalogSnapshot"], Dict[str, np.ndarray]], schema: str = ""):
+    """Store derived(key) in compiled catalogs, as the named arrays to_arrays(snapshot) returns.
+
+    schema identifies whatever besides the forms the arrays depend on (their
+    layout, the holiday calendars); catalogs holding arrays built under
+    another schema are recompiled rather than trusted.
+    """
+    _shared_builders[key] = (to_arrays, schema)
+
+
+def _current_arrays(shared: CatalogFile, key: str) -> Optional[Dict[str, np.ndarray]]:
+    """The arrays shared stores for key, or None if missing or built under another schema."""
+    arrays = shared.arrays(key)
+    stored = arrays.pop(SCHEMA_ARRAY, None)
+    builder = _shared_builders.get(key)
+    if not arrays or stored is None or builder is None or str(stored[0]) != builder[1]:
+        return None
+    return arrays
+
+
+# Edits touching more forms than this rebuild structures that are costly to patch
+SMALL_CHANGE = 64
+
+
+class CatalogChange(NamedTuple):
+    """Forms old[start:old_stop] became new[start:new_stop]; the rest only moved."""
+    start: int
+    old_stop: int
+    new_stop: int
+
+    @property
+    def shift(self) -> int:
+        """How far the forms after the change moved."""
+        return self.new_stop - self.old_stop
+
+    @property
+    def size(self) -> int:
+        return max(self.old_stop, self.new_stop) - self.start
+
+    def new_position(self, position: int) -> Optional[int]:
+        """Where an unchanged form at an old position is now, or None if it was replaced."""
+        if position < self.start:
+            return position
+        if position >= self.old_stop:
+            return position + self.shift
+        return None
+
+    @classmethod
+    def from_form_change(cls, change: FormChange) -> "CatalogChange":
+        position = change.position
+        if change.op == "add":
+            return cls(position, position, position + 1)
+        if change.op == "delete":
+            return cls(position, position + 1, position)
+        return cls(position, position + 1, position + 1)
+
+
+def diff_forms(old: Sequence[Mapping[str, Any]], new: Sequence[Mapping[str, Any]]) -> Optional[CatalogChange]:
+    """Find the one window two catalogs differ in (None if they are equal).
+
+    Edits change, add or delete a few neighbouring forms, so trimming the
+    common prefix and suffix pins them down without a full diff.
+    """
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and (old[start] is new[start] or old[start] == new[start]):
+        start += 1
+    if start == len(old) == len(new):
+        return None
+    end = 0
+    while end < limit - start and (old[-1 - end] is new[-1 - end] or old[-1 - end] == new[-1 - end]):
+        end += 1
+    return CatalogChange(start, len(old) - end, len(new) - end)
+
+
+# Derived structures that can be patched for a change instead of rebuilt:
+# carry(value, previous, snapshot, change) returns the value for snapshot,
+# or None to let it be built from scratch on first use
+_carriers: Dict[str, Callable[[Any, "CatalogSnapshot", "CatalogSnapshot", CatalogChange], Any]] = {}
+
+
+def carry_derived(key: str, carry: Callable[[Any, "CatalogSnapshot", "CatalogSnapshot", CatalogChange], Any]):
+    """Carry derived(key) forward to the next snapshot by patching it for each change."""
+    _carriers[key] = carry
+
+
+class CatalogSnapshot:
+    """Immutable view of the forms catalog at a single point in time."""
+
+    __slots__ = ("version", "forms", "shared", "stamp", "_derived")
+
+    def __init__(
+        self,
+        version: int,
+        forms: Tuple[Mapping[str, Any], ...],
+        shared: Optional[CatalogFile] = None,
+        stamp: str = "",
+    ):
+        # Counts reloads in this process only; compare stamps across processes
+        self.version = version
+        self.forms = forms
+        # The mapped catalog file these forms came from, if any
+        self.shared = shared
+        # Identifies the stored catalog in every process reading it: the
+        # forms.json sha256, or the SQLite write counter ("" if unknown)
+        self.stamp = stamp or (shared.stamp if shared is not None else "")
+        self._derived: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.forms)
+
+    def get_form(self, form_id: int) -> Optional[Mapping[str, Any]]:
+        """Get a form by ID (position in array + 1)."""
+        if 0 <= form_id - 1 < len(self.forms):
+            return self.forms[form_id - 1]
+        return None
+
+    def shared_arrays(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """The arrays stored for derived(key) in the mapped catalog, if it has them."""
+        if self.shared is None:
+            return None
+        return _current_arrays(self.shared, key)
+
+    def derived(self, key: str, factory: Callable[["CatalogSnapshot"], Any]) -> Any:
+        """Get a structure computed from this snapshot, building it on first use."""
+        value = self._derived.get(key)
+        if value is None:
+            value = self._derived.setdefault(key, factory(self))
+        return value
+
+    def carry_from(self, previous: "CatalogSnapshot", change: CatalogChange):
+        """Seed derived() with the previous snapshot's structures, patched for change."""
+        for key, carry in _carriers.items():
+            value = previous._derived.get(key)
+            if value is not None and key not in self._derived:
+                carried = carry(value, previous, self, change)
+                if carried is not None:
+                    self._derived[key] = carried
+
+    def to_data(self) -> Dict[str, Any]:
+        """Return a mutable copy of the catalog in the forms.json layout."""
+        return {"forms": [thaw(form) for form in self.forms]}
+
+
+def _store_stamp(signature: Tuple[int, ...]) -> str:
+    """Stamp of a store without a content hash (SQLite: its write counter)."""
+    return "v" + ".".join(str(part) for part in signature)
+
+
+class FormsCatalog:
+    """Process-wide cache of the forms catalog, revalidated against its store."""
+
+    def __init__(self, json_path: Optional[str] = None, store=None):
+        """Initialize the catalog with a store (forms.json at json_path by default)."""
+        self.store = store or default_store(json_path)
+        self._lock = threading.Lock()
+        # Serializes read-modify-publish cycles within this process, so only
+        # writers in other processes can make publish() raise StaleWriteError
+        self.write_lock = threading.RLock()
+        self._signature: Optional[Tuple[int, ...]] = None
+        self._snapshot = CatalogSnapshot(0, ())
+        self.hits = 0
+        self.misses = 0
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Get the current catalog, reloading the store only if it changed."""
+        signature = self.store.signature()
+        if signature == self._signature:
+            self.hits += 1
+            return self._snapshot
+
+        # Only the first load waits; later reloads keep serving the previous
+        # catalog to other threads until the new one is ready
+        if not self._lock.acquire(blocking=self._signature is None):
+            return self._snapshot
+        try:
+            # Another thread may have reloaded while we waited for the lock
+            if signature == self._signature:
+                self.hits += 1
+                return self._snapshot
+
+            self.misses += 1
+            if not signature:
+                print(f"Warning: forms catalog not found at {self.store.location}")
+                self._snapshot = CatalogSnapshot(self._snapshot.version + 1, ())
+                self._signature = signature
+                return self._snapshot
+
+            previous = self._snapshot
+            try:
+                snapshot = self._load(previous.version + 1, signature)
+                change = diff_forms(previous.forms, snapshot.forms)
+            except Exception as e:
+                # Keep serving the last good snapshot; retry on the next call
+                print(f"Error loading forms catalog: {e}")
+                return self._snapshot
+
+            if change is None:
+                # Rewritten with the same forms; sessions have nothing to refresh
+                self._signature = signature
+                return previous
+            snapshot.carry_from(previous, change)
+
+            # Publish the snapshot before the signature so lock-free readers
+            # never pair a new signature with the previous snapshot
+            self._snapshot = snapshot
+            self._signature = signature
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def _load(self, version: int, signature: Tuple[int, ...]) -> CatalogSnapshot:
+        """Read the store, mapping the compiled catalog instead when it is current.
+
+        Otherwise forms are compacted as they stream in, so the raw parse
+        of the whole catalog is never held at once, and then compiled for
+        the other workers and the next start.
+        """
+        if not isinstance(self.store, JsonFormsStore):
+            return CatalogSnapshot(version, compact_forms(self.store.iter_forms()), stamp=_store_stamp(signature))
+
+        source_sha256 = file_sha256(self.store.json_path)
+        try:
+            shared: Optional[CatalogFile] = CatalogFile(compiled_path(self.store.json_path), source_sha256)
+        except CatalogFileError:
+            shared = None
+        if shared is not None and any(_current_arrays(shared, key) is None for key in _shared_builders):
+            # Compiled before a table layout or holiday calendar changed
+            shared.close()
+            shared = None
+        if shared is None:
+            snapshot = CatalogSnapshot(version, compact_forms(self.store.iter_forms()), stamp=source_sha256.hex())
+            return self._share(snapshot, source_sha256)
+        return CatalogSnapshot(version, shared.records(), shared)
+
+    def _share(self, snapshot: CatalogSnapshot, source_sha256: bytes) -> CatalogSnapshot:
+        """Compile a snapshot of forms.json for every worker and map it here too."""
+        path = compiled_path(self.store.json_path)
+        try:
+            arrays = {}
+            for key, (to_arrays, schema) in _shared_builders.items():
+                for name, value in to_arrays(snapshot).items():
+                    arrays[f"{key}.{name}"] = value
+                arrays[f"{key}.{SCHEMA_ARRAY}"] = np.array([schema], dtype=str)
+            write_catalog_file(path, snapshot.forms, source_sha256, arrays)
+            snapshot.shared = CatalogFile(path, source_sha256)
+        except OSError as e:
+            print(f"Error writing compiled catalog: {e}")
+        except CatalogFileError:
+            # Another process already replaced it with a newer catalog
+            pass
+        return snapshot
+
+    def publish(
+        self,
+        forms: Tuple[Mapping[str, Any], ...],
+        derived: Optional[Dict[str, Any]] = None,
+        change: Optional[FormChange] = None,
+        base: Optional[CatalogSnapshot] = None
+    ) -> CatalogSnapshot:
+        """Persist frozen forms and make them the current snapshot.
+
+        change describes the single-form edit that produced forms, so stores
+        write just that form (SQLite) or splice it into the file (JSON).
+        derived seeds the new snapshot's derived() cache so writers that know
+        exactly what changed can carry indexes forward instead of rebuilding
+        them.
+
+        base is the snapshot forms were derived from. If another thread or
+        process has written since, nothing is saved and StaleWriteError is
+        raised so the caller can re-apply its edit to the latest catalog.
+        """
+        with self._lock:
+            if base is not None and base is not self._snapshot:
+                raise StaleWriteError("forms catalog changed since it was read")
+            try:
+                expected = self._signature if base is not None else None
+                saved = self.store.save(forms, change, expected_signature=expected)
+            except StaleWriteError:
+                # The store moved on without us; reload on the next snapshot()
+                self._signature = None
+                raise
+
+            previous = self._snapshot
+            stamp = saved.source_sha256.hex() if saved.source_sha256 else _store_stamp(saved.signature)
+            snapshot = CatalogSnapshot(previous.version + 1, forms, stamp=stamp)
+            snapshot._derived.update(derived or {})
+            # Patch the previous snapshot's structures for the edit
+            if change is not None and base is not None:
+                edit = CatalogChange.from_form_change(change)
+            else:
+                edit = diff_forms(previous.forms, forms)
+            if edit is not None:
+                snapshot.carry_from(previous, edit)
+            # The signature of what we wrote, not of the store now: another
+            # process may have committed since, and its edit must be reloaded
+            self._snapshot = snapshot
+            self._signature = saved.signature
+            if isinstance(self.store, JsonFormsStore):
+                # Other workers map the new catalog instead of re-parsing forms.json
+                self._share(snapshot, saved.source_sha256)
+            return snapshot
+
+    def invalidate(self):
+        """Force the next snapshot() call to re-read the file."""
+        with self._lock:
+            self._signature = None
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache counters for monitoring."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self._snapshot.version,
+            "forms": len(self._snapshot.forms),
+        }
+
+
+_catalogs: Dict[str, FormsCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(json_path: Optional[str] = None) -> FormsCatalog:
+    """Get the shared catalog for a forms.json path (or the app's default store)."""
+    key = os.path.abspath(json_path) if json_path else ""
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                catalog = _catalogs[key] = FormsCatalog(json_path)
+    return catalog
@@ -1,35 +1,199 @@
 # tax_forms/backend/forms_repository.py
-import json
-import os
-from typing import List, Dict, Any, Optional
-from pathlib import Path
+import sqlite3
+from typing import List, Dict, Any, Callable, Mapping, Optional, Tuple
+
+from .form_index import get_form_index
+from .form_query import FormQuery, run_query
+from .forms_catalog import CatalogSnapshot, get_catalog
+from .forms_store import FormChange, FormRecord, StaleWriteError, form_fingerprint, thaw
+
+# How many times a write is re-applied after losing a race with another writer
+WRITE_ATTEMPTS = 3
 
 class FormsRepository:
     """Repository for managing tax forms data."""
-    
+
     def __init__(self, json_path: Optional[str] = None):
         """Initialize the repository with a path to the JSON file."""
-        self.json_path = json_path or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "forms.json")
-        self.data = self._load_json()
-    
-    def _load_json(self) -> Dict[str, Any]:
-        """Load JSON data from file."""
-        try:
-            path = Path(self.json_path)
-            if path.exists():
-                with open(path, 'r') as f:
-                    return json.load(f)
-            else:
-                print(f"Warning: JSON file not found at {self.json_path}")
-                return {"forms": []}
-        except Exception as e:
-            print(f"Error loading JSON: {e}")
-            return {"forms": []}
-    
+        self.catalog = get_catalog(json_path)
+        self.json_path = self.catalog.store.location
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """Get the current catalog snapshot shared with every other reader."""
+        return self.catalog.snapshot()
+
+    def _with_id(self, form: Mapping[str, Any], position: int) -> Dict[str, Any]:
+        """Copy a catalog form and add its ID (position in array + 1)."""
+        form_copy = thaw(form)
+        form_copy['id'] = position + 1
+        return form_copy
+
+    def _to_json_form(self, form_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert from our form format to the JSON schema format."""
+        json_form = {
+            'formNumber': form_data.get('formNumber', ''),
+            'formName': form_data.get('formName', ''),
+            'entityType': form_data.get('entityType', 'individual'),
+            'localityType': form_data.get('localityType', 'federal'),
+            'locality': form_data.get('locality', 'United States'),
+            'parentFormNumbers': form_data.get('parentFormNumbers', []),
+            'owner': form_data.get('owner', 'MPM'),
+            'calculationBase': form_data.get('calculationBase', 'end'),
+            'calculationRules': form_data.get('calculationRules', [])
+        }
+        # Only forms that have an extension carry the key, so saves round-trip
+        if 'extension' in form_data:
+            json_form['extension'] = form_data['extension']
+        return json_form
+
     def get_all_forms(self) -> List[Dict[str, Any]]:
         """Get all forms."""
-        forms = self.data.get('forms', [])
-        # Add an ID for each form (position in array + 1)
-        for i, form in enumerate(forms):
-            form['id'] = i + 1
-        return forms
\ No newline at end of file
+        # Add an ID for each form (position in array + 1) without touching the shared snapshot
+        return [{**form, 'id': i + 1} for i, form in enumerate(self.snapshot.forms)]
+
+    def find_form(self, form_id: int) -> Optional[Dict[str, Any]]:
+        """Find a form by ID."""
+        form = self.snapshot.get_form(form_id)
+        if form is None:
+            return None
+        return self._with_id(form, form_id - 1)
+
+    def find_form_by_attributes(
+        self,
+        form_number: str,
+        entity_type: str,
+        locality_type: str,
+        locality: str
+    ) -> Optional[Dict[str, Any]]:
+        """Find a form by its attributes."""
+        snapshot = self.snapshot
+        position = get_form_index(snapshot).find((form_number, entity_type, locality_type, locality))
+        if position is None:
+            return None
+        return self._with_id(snapshot.forms[position], position)
+
+    def find_forms_by_number(self, form_number: str) -> List[Dict[str, Any]]:
+        """Find every form with a form number, across entity types and localities."""
+        snapshot = self.snapshot
+        positions = get_form_index(snapshot).by_number.get(form_number, [])
+        return [self._with_id(snapshot.forms[position], position) for position in positions]
+
+    def find_forms(
+        self,
+        entity_type: Optional[str] = None,
+        locality: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Find forms by entity type and/or locality."""
+        snapshot = self.snapshot
+        index = get_form_index(snapshot)
+        buckets = []
+        if entity_type is not None:
+            buckets.append(index.by_entity_type.get(entity_type, []))
+        if locality is not None:
+            buckets.append(index.by_locality.get(locality, []))
+        if not buckets:
+            positions = range(len(snapshot.forms))
+        elif len(buckets) == 1:
+            positions = buckets[0]
+        else:
+            # Intersect starting from the smaller bucket
+            small, large = sorted(buckets, key=len)
+            large_set = set(large)
+            positions = [position for position in small if position in large_set]
+        return [self._with_id(snapshot.forms[position], position) for position in positions]
+
+    def _write(self, apply: Callable[[CatalogSnapshot], Tuple[Any, ...]]) -> Any:
+        """Apply an edit to the latest snapshot and publish it, retrying lost races.
+
+        apply(snapshot) returns (forms, derived, change, result), or None for
+        a no-op. If another writer publishes first, the edit is re-applied to
+        the fresh catalog instead of overwriting theirs.
+        """
+        with self.catalog.write_lock:
+            for attempt in range(WRITE_ATTEMPTS):
+                snapshot = self.snapshot
+                applied = apply(snapshot)
+                if applied is None:
+                    return None
+                forms, derived, change, result = applied
+                try:
+                    self.catalog.publish(forms, derived, change, base=snapshot)
+                    return result
+                except StaleWriteError:
+                    if attempt == WRITE_ATTEMPTS - 1:
+                        raise
+
+    def _check_fingerprint(self, form: Mapping[str, Any], expected_fingerprint: Optional[str]):
+        """Reject an edit to a form that changed (or moved) since the caller read it."""
+        if expected_fingerprint is not None and form_fingerprint(form) != expected_fingerprint:
+            raise StaleWriteError("form was changed by another user")
+
+    def query_forms(self, query: FormQuery) -> Tuple[List[Dict[str, Any]], int]:
+        """Filter, search, sort and page the forms; returns the page and the match count."""
+        snapshot = self.snapshot
+        result = run_query(snapshot, query)
+        return [self._with_id(snapshot.forms[position], position) for position in result.positions], result.total
+
+    def add_form(self, form_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a new form."""
+        json_form = self._to_json_form(form_data)
+        frozen = FormRecord.from_data(json_form)
+
+        def apply(snapshot: CatalogSnapshot):
+            position = len(snapshot.forms)
+            index = get_form_index(snapshot).with_added(position, frozen)
+            # Return the new form with an ID
+            return (
+                snapshot.forms + (frozen,), {"form_index": index},
+                FormChange("add", position, frozen), {**json_form, 'id': position + 1}
+            )
+
+        return self._write(apply)
+
+    def update_form(
+        self,
+        form_id: int,
+        form_data: Dict[str, Any],
+        expected_fingerprint: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Update an existing form.
+
+        Pass the form_fingerprint() of the form as it was read to make the
+        update fail with StaleWriteError if someone else changed it first.
+        """
+        json_form = self._to_json_form(form_data)
+        frozen = FormRecord.from_data(json_form)
+        index = form_id - 1
+
+        def apply(snapshot: CatalogSnapshot):
+            if not 0 <= index < len(snapshot.forms):
+                return None
+            self._check_fingerprint(snapshot.forms[index], expected_fingerprint)
+            form_index = get_form_index(snapshot).with_updated(index, snapshot.forms[index], frozen)
+            forms = snapshot.forms[:index] + (frozen,) + snapshot.forms[index + 1:]
+            # Return the updated form with an ID
+            return (
+                forms, {"form_index": form_index},
+                FormChange("update", index, frozen), {**json_form, 'id': form_id}
+            )
+
+        return self._write(apply)
+
+    def delete_form(self, form_id: int, expected_fingerprint: Optional[str] = None) -> bool:
+        """Delete a form."""
+        index = form_id - 1
+
+        def apply(snapshot: CatalogSnapshot):
+            if not 0 <= index < len(snapshot.forms):
+                return None
+            self._check_fingerprint(snapshot.forms[index], expected_fingerprint)
+            form_index = get_form_index(snapshot).with_deleted(index, snapshot.forms[index])
+            forms = snapshot.forms[:index] + snapshot.forms[index + 1:]
+            return forms, {"form_index": form_index}, FormChange("delete", index), True
+
+        try:
+            return bool(self._write(apply))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error saving JSON: {e}")
+            return False
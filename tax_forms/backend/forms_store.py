@@ -0,0 +1,855 @@
+# tax_forms/backend/forms_store.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import stat
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from operator import attrgetter
+from types import MappingProxyType
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the atomic rename alone
+    fcntl = None
+
+DEFAULT_FORMS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "forms.json"
+)
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert parsed JSON into read-only containers."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Recursively convert a frozen value back into mutable dicts and lists."""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+# Fields every form has; they live in slots rather than a per-form dict
+FORM_FIELDS = (
+    "formNumber", "formName", "entityType", "localityType", "locality",
+    "parentFormNumbers", "owner", "calculationBase", "extension", "calculationRules",
+)
+_FORM_FIELD_SET = frozenset(FORM_FIELDS)
+
+# Short values repeated across most forms, interned so all forms share one copy
+_INTERNED_FIELDS = ("entityType", "localityType", "locality", "owner", "calculationBase")
+
+# Nested values often identical between forms, shared within a catalog load
+_SHARED_FIELDS = ("parentFormNumbers", "extension", "calculationRules")
+
+_MISSING = object()
+
+
+class FormRecord(Mapping):
+    """Read-only form with its standard fields in slots.
+
+    Behaves like the frozen dict it replaces (get, [], iteration in the
+    original key order), at a fraction of the memory. Fields outside
+    FORM_FIELDS are kept in a small dict.
+    """
+
+    __slots__ = FORM_FIELDS + ("_keys", "_extra")
+
+    @classmethod
+    def from_data(cls, form: Mapping[str, Any], pool: Optional[Dict[Any, Any]] = None) -> "FormRecord":
+        """Build a record from parsed JSON, sharing repeated values through pool."""
+        if isinstance(form, FormRecord):
+            return form
+
+        record = cls.__new__(cls)
+        keys = tuple(form)
+        record._keys = pool.setdefault(("keys", keys), keys) if pool is not None else keys
+        extra = None
+        for key, value in form.items():
+            if key not in _FORM_FIELD_SET:
+                if extra is None:
+                    extra = {}
+                extra[key] = freeze(value)
+            elif key in _INTERNED_FIELDS and type(value) is str:
+                setattr(record, key, sys.intern(value))
+            elif pool is not None and key in _SHARED_FIELDS and isinstance(value, (dict, list)):
+                shared_key = (key, json.dumps(value))
+                shared = pool.get(shared_key)
+                if shared is None:
+                    shared = pool[shared_key] = freeze(value)
+                setattr(record, key, shared)
+            else:
+                setattr(record, key, freeze(value))
+        for key in FORM_FIELDS:
+            if key not in form:
+                setattr(record, key, _MISSING)
+        record._extra = MappingProxyType(extra) if extra else None
+        return record
+
+    # Placeholder for a standard field the form does not have
+    MISSING = _MISSING
+
+    @classmethod
+    def from_row(
+        cls, keys: Tuple[str, ...], values: Iterable[Any], extra: Optional[Mapping[str, Any]] = None
+    ) -> "FormRecord":
+        """Build a record from frozen values in FORM_FIELDS order (MISSING for absent fields)."""
+        record = cls.__new__(cls)
+        record._keys = keys
+        for key, value in zip(FORM_FIELDS, values):
+            setattr(record, key, value)
+        record._extra = extra or None
+        return record
+
+    def present_fields(self) -> Dict[str, Any]:
+        """Get the standard fields this form has, without the missing ones."""
+        return {key: getattr(self, key) for key in FORM_FIELDS if getattr(self, key) is not _MISSING}
+
+    @property
+    def extra(self) -> Optional[Mapping[str, Any]]:
+        """Fields outside FORM_FIELDS, if any."""
+        return self._extra
+
+    @property
+    def key_order(self) -> Tuple[str, ...]:
+        return self._keys
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FORM_FIELD_SET:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _FORM_FIELD_SET:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"FormRecord({dict(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, FormRecord):
+            # Same as comparing as dicts (key order aside), without building them
+            return _record_values(self) == _record_values(other)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return FormRecord.from_data, (thaw(self),)
+
+
+_record_values = attrgetter("_extra", *FORM_FIELDS)
+
+
+def compact_forms(forms: Iterable[Mapping[str, Any]]) -> Tuple[FormRecord, ...]:
+    """Convert parsed forms into records, sharing repeated values across the catalog."""
+    pool: Dict[Any, Any] = {}
+    return tuple(FormRecord.from_data(form, pool) for form in forms)
+
+
+def form_fingerprint(form: Mapping[str, Any]) -> str:
+    """Hash a form's contents, for detecting edits made since it was read."""
+    return hashlib.sha1(json.dumps(thaw(form), sort_keys=True).encode()).hexdigest()
+
+
+class StaleWriteError(Exception):
+    """Raised when a write is based on a catalog or form that has since changed."""
+
+
+class FormChange(NamedTuple):
+    """A single-form edit: op is "add", "update" or "delete" at a 0-based position."""
+    op: str
+    position: int
+    form: Optional[Mapping[str, Any]] = None
+
+
+class SavedCatalog(NamedTuple):
+    """What a store wrote: its signature right after the write (and the new file's sha256)."""
+    signature: Tuple[int, ...]
+    source_sha256: Optional[bytes] = None
+
+
+# How much of a file is read at a time while streaming forms.json or hashing
+READ_CHUNK_SIZE = 1 << 16
+HASH_CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = " \t\n\r"
+_SCALAR_END = re.compile(r"[,\]}\s]")
+
+
+class _JsonStream:
+    """A read buffer over a JSON text file that only keeps the unparsed tail."""
+
+    def __init__(self, f: IO[str], chunk_size: int, echo: Optional[IO[str]] = None):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # If given, consumed text is copied here unless skip() drops it
+        self.echo = echo
+        self.echoed = 0
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been consumed (and, when echoing, flushed or
+        # skipped) so the buffer stays around one item long
+        keep = min(self.pos, self.echoed) if self.echo is not None else self.pos
+        self.buffer = self.buffer[keep:] + chunk
+        self.pos -= keep
+        self.echoed = max(self.echoed - keep, 0)
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ("" at end of file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", found or "<end of file>", self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value, reading more of the file as needed."""
+        if self.peek() not in '{["':
+            # A number or literal cut off by the chunk would still decode
+            # (as "12" of "12.5"), so read until something ends it
+            while _SCALAR_END.search(self.buffer, self.pos) is None and self._fill():
+                pass
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # Objects, arrays and strings cut off by the chunk fail to decode
+                if not self._fill():
+                    raise
+
+    def flush(self):
+        """Copy the text consumed since the last flush() or skip() to echo."""
+        if self.echo is not None:
+            self.echo.write(self.buffer[self.echoed:self.pos])
+        self.echoed = self.pos
+
+    def skip(self):
+        """Leave the text consumed since the last flush() or skip() out of echo."""
+        self.echoed = self.pos
+
+    def copy_rest(self):
+        """Copy the rest of the file to echo, from the last flush() or skip(), without parsing it."""
+        self.echo.write(self.buffer[self.echoed:])
+        self.buffer, self.pos, self.echoed = "", 0, 0
+        for chunk in iter(lambda: self.f.read(self.chunk_size), ""):
+            self.echo.write(chunk)
+
+
+def iter_json_array(f: IO[str], key: str = "forms", chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the items of the array at a top-level key one at a time.
+
+    Only the current item and one read chunk are held in memory, so the
+    peak stays flat however large the file is. Other top-level keys are
+    parsed and discarded.
+    """
+    stream = _JsonStream(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name == key and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() != "]":
+                while True:
+                    yield stream.value()
+                    if stream.peek() != ",":
+                        break
+                    stream.expect(",")
+            stream.expect("]")
+        else:
+            stream.value()
+        if stream.peek() != ",":
+            break
+        stream.expect(",")
+    stream.expect("}")
+
+
+def _form_json(form: Mapping[str, Any]) -> str:
+    """One form as json.dump(..., indent=2) writes it inside the forms array."""
+    return json.dumps(thaw(form), indent=2).replace("\n", "\n    ")
+
+
+def splice_json_forms(source: IO[str], target: IO[str], change: FormChange, chunk_size: int = READ_CHUNK_SIZE):
+    """Copy a forms.json file to target with one form added, replaced or removed.
+
+    Forms before change.position are scanned to find where the edit goes
+    and copied as they are; everything after it is copied unparsed. Only
+    the edited form is serialized. Raises json.JSONDecodeError if the file
+    has no forms array or change.position is not in it.
+    """
+    stream = _JsonStream(source, chunk_size, echo=target)
+    stream.expect("{")
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name == "forms" and stream.peek() == "[":
+            break
+        stream.value()
+        stream.expect(",")
+    stream.expect("[")
+    for i in range(change.position):
+        if i:
+            stream.expect(",")
+        stream.value()
+        stream.flush()
+
+    if change.op == "add":
+        if change.position:
+            target.write(",\n    " + _form_json(change.form))
+        else:
+            stream.flush()
+            target.write("\n    " + _form_json(change.form) + ("" if stream.peek() == "]" else ","))
+    elif change.op == "update":
+        if change.position:
+            stream.expect(",")
+        stream.peek()
+        stream.flush()
+        stream.value()
+        stream.skip()
+        target.write(_form_json(change.form))
+    elif change.op == "delete":
+        if change.position:
+            # Drop the comma before the form along with it
+            stream.expect(",")
+            stream.value()
+        else:
+            stream.peek()
+            stream.flush()
+            stream.value()
+            if stream.peek() == ",":
+                stream.expect(",")
+                stream.peek()
+        stream.skip()
+    else:
+        raise ValueError(f"Unknown change: {change.op}")
+    stream.copy_rest()
+
+
+# The process umask, read once: os.umask() can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def keep_file_mode(fd: int, path: str):
+    """Give the temp file open as fd the mode of path, which it is about to replace.
+
+    mkstemp creates files readable by their owner only; without this, the
+    first atomic save would lock other users and services out of the file.
+    A new file gets the usual mode for the process umask.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, mode)
+
+
+def file_sha256(path: str) -> bytes:
+    """sha256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class JsonFormsStore:
+    """Keeps the catalog in a forms.json file."""
+
+    def __init__(self, json_path: str):
+        self.json_path = json_path
+        self.location = os.path.abspath(json_path)
+
+    def signature(self) -> Tuple[int, ...]:
+        """Identify the current file contents by inode, device, mtime and size."""
+        try:
+            st = os.stat(self.json_path)
+        except OSError:
+            return ()
+        return (st.st_ino, st.st_dev, st.st_mtime_ns, st.st_size)
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load all forms from the file."""
+        return list(self.iter_forms())
+
+    def iter_forms(self) -> Iterator[Dict[str, Any]]:
+        """Stream forms from the file one at a time."""
+        with open(self.json_path, "r") as f:
+            yield from iter_json_array(f, "forms")
+
+    @contextmanager
+    def _swap_lock(self):
+        """Serialize the check-and-rename step across processes (not the write itself)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.json_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _splice(self, f: IO[str], change: FormChange, expected_signature: Tuple[int, ...]) -> bool:
+        """Write the current file with change applied to f; False (and f emptied) if it cannot be parsed."""
+        try:
+            with open(self.json_path, "r") as source:
+                st = os.fstat(source.fileno())
+                if (st.st_ino, st.st_dev, st.st_mtime_ns, st.st_size) != expected_signature:
+                    raise StaleWriteError(f"{self.location} changed since it was read")
+                splice_json_forms(source, f, change)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Rewriting all of {self.json_path}: {e}")
+            f.seek(0)
+            f.truncate()
+            return False
+
+    def save(
+        self,
+        forms: Iterable[Mapping[str, Any]],
+        change: Optional[FormChange] = None,
+        expected_signature: Optional[Tuple[int, ...]] = None
+    ) -> SavedCatalog:
+        """Atomically replace the file with all forms.
+
+        Returns the signature of the renamed file, taken before any other
+        writer can replace it, and its sha256.
+
+        A JSON file cannot be edited in place, but when change is given and
+        the file is still the expected_signature one, the new file is the
+        old one with just the changed form spliced in, so unchanged forms
+        are copied rather than re-serialized. Otherwise all forms are
+        written. The new contents are written and fsynced to a temporary
+        file first, so readers see either the old or the new catalog, never
+        a partial one. If expected_signature is given and the file has
+        changed since, the write is rejected with StaleWriteError.
+        """
+        directory = os.path.dirname(self.location)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".forms-", suffix=".json.tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                keep_file_mode(f.fileno(), self.json_path)
+                if not (change is not None and expected_signature and self._splice(f, change, expected_signature)):
+                    json.dump({"forms": [thaw(form) for form in forms]}, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            # Hashed before the rename, so it is this write's bytes even if
+            # another writer replaces the file right after
+            sha256 = file_sha256(temp_path)
+
+            with self._swap_lock():
+                if expected_signature is not None and self.signature() != expected_signature:
+                    raise StaleWriteError(f"{self.location} changed since it was read")
+                os.replace(temp_path, self.json_path)
+                signature = self.signature()
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        # Make the rename itself durable
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(directory, os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        return SavedCatalog(signature, sha256)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS forms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    form_number TEXT,
+    form_name TEXT,
+    entity_type TEXT,
+    locality_type TEXT,
+    locality TEXT,
+    owner TEXT,
+    calculation_base TEXT,
+    parent_form_numbers TEXT,
+    extension TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS calculation_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    form_id INTEGER NOT NULL REFERENCES forms(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS calculation_rules_form ON calculation_rules(form_id, position);
+CREATE TABLE IF NOT EXISTS effective_years (
+    rule_id INTEGER NOT NULL REFERENCES calculation_rules(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    PRIMARY KEY (rule_id, position)
+);
+CREATE TABLE IF NOT EXISTS date_rules (
+    rule_id INTEGER NOT NULL REFERENCES calculation_rules(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    months_after_calculation_base INTEGER,
+    months_after_year_start INTEGER,
+    day_of_month INTEGER,
+    extra TEXT,
+    PRIMARY KEY (rule_id, kind)
+);
+CREATE TABLE IF NOT EXISTS fiscal_year_exceptions (
+    rule_id INTEGER NOT NULL REFERENCES calculation_rules(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    month TEXT NOT NULL,
+    months_after_calculation_base INTEGER,
+    months_after_year_start INTEGER,
+    day_of_month INTEGER,
+    extra TEXT,
+    PRIMARY KEY (rule_id, kind, month)
+);
+INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('version', 0);
+"""
+
+# JSON keys stored in their own columns; anything else is kept in "extra"
+FORM_COLUMNS = (
+    ("formNumber", "form_number"),
+    ("formName", "form_name"),
+    ("entityType", "entity_type"),
+    ("localityType", "locality_type"),
+    ("locality", "locality"),
+    ("owner", "owner"),
+    ("calculationBase", "calculation_base"),
+)
+FORM_JSON_COLUMNS = (
+    ("parentFormNumbers", "parent_form_numbers"),
+    ("extension", "extension"),
+)
+OFFSET_COLUMNS = (
+    ("monthsAfterCalculationBase", "months_after_calculation_base"),
+    ("monthsAfterYearStart", "months_after_year_start"),
+    ("dayOfMonth", "day_of_month"),
+)
+DATE_RULE_KINDS = ("dueDate", "extensionDueDate")
+
+
+def _extra(source: Mapping[str, Any], known: Iterable[str]) -> Optional[str]:
+    """Serialize keys without a column of their own, so nothing is lost on import."""
+    known = set(known)
+    extra = {key: thaw(value) for key, value in source.items() if key not in known}
+    return json.dumps(extra) if extra else None
+
+
+def _offset_values(source: Mapping[str, Any]) -> List[Any]:
+    return [source.get(key) for key, _ in OFFSET_COLUMNS]
+
+
+def _offset_dict(row: Tuple[Any, ...], extra: Optional[str]) -> Dict[str, Any]:
+    result = {key: value for (key, _), value in zip(OFFSET_COLUMNS, row) if value is not None}
+    if extra:
+        result.update(json.loads(extra))
+    return result
+
+
+class SqliteFormsStore:
+    """Keeps the catalog in normalized SQLite tables (WAL mode).
+
+    Forms are ordered by their row id, so a form's position (and with it
+    its ID in the app) matches the order of forms.json after an import.
+    Single-form edits only touch that form's rows.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.location = os.path.abspath(db_path)
+        self._lock = threading.Lock()
+        self._row_ids: List[int] = []
+        directory = os.path.dirname(self.location)
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def signature(self) -> Tuple[int, ...]:
+        """Identify the current catalog by its write counter."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+        return (row[0],)
+
+    def iter_forms(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over all forms in position order (read in one transaction)."""
+        return iter(self.load())
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load all forms in position order."""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                form_rows = conn.execute(
+                    "SELECT id, form_number, form_name, entity_type, locality_type, locality, owner, "
+                    "calculation_base, parent_form_numbers, extension, extra FROM forms ORDER BY id"
+                ).fetchall()
+                rule_rows = conn.execute(
+                    "SELECT id, form_id, extra FROM calculation_rules ORDER BY form_id, position"
+                ).fetchall()
+                year_rows = conn.execute(
+                    "SELECT rule_id, year FROM effective_years ORDER BY rule_id, position"
+                ).fetchall()
+                date_rows = conn.execute(
+                    "SELECT rule_id, kind, months_after_calculation_base, months_after_year_start, "
+                    "day_of_month, extra FROM date_rules"
+                ).fetchall()
+                exception_rows = conn.execute(
+                    "SELECT rule_id, kind, month, months_after_calculation_base, months_after_year_start, "
+                    "day_of_month, extra FROM fiscal_year_exceptions ORDER BY rule_id, kind, month"
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+
+            years: Dict[int, List[int]] = {}
+            for rule_id, year in year_rows:
+                years.setdefault(rule_id, []).append(year)
+
+            exceptions: Dict[Tuple[int, str], Dict[str, Any]] = {}
+            for rule_id, kind, month, *offsets, extra in exception_rows:
+                exceptions.setdefault((rule_id, kind), {})[month] = _offset_dict(offsets, extra)
+
+            date_rules: Dict[int, Dict[str, Any]] = {}
+            for rule_id, kind, *offsets, extra in date_rows:
+                date_rule = _offset_dict(offsets, None)
+                if (rule_id, kind) in exceptions:
+                    date_rule["fiscalYearExceptions"] = exceptions[(rule_id, kind)]
+                if extra:
+                    date_rule.update(json.loads(extra))
+                date_rules.setdefault(rule_id, {})[kind] = date_rule
+
+            rules: Dict[int, List[Dict[str, Any]]] = {}
+            for rule_id, form_id, extra in rule_rows:
+                rule = {"effectiveYears": years.get(rule_id, [])}
+                for kind in DATE_RULE_KINDS:
+                    if kind in date_rules.get(rule_id, {}):
+                        rule[kind] = date_rules[rule_id][kind]
+                if extra:
+                    rule.update(json.loads(extra))
+                rules.setdefault(form_id, []).append(rule)
+
+            forms = []
+            for form_id, *values, parent_form_numbers, extension, extra in form_rows:
+                form = {key: value for (key, _), value in zip(FORM_COLUMNS, values) if value is not None}
+                if parent_form_numbers is not None:
+                    form["parentFormNumbers"] = json.loads(parent_form_numbers)
+                form["calculationRules"] = rules.get(form_id, [])
+                if extension is not None:
+                    form["extension"] = json.loads(extension)
+                if extra:
+                    form.update(json.loads(extra))
+                forms.append(form)
+
+            self._row_ids = [row[0] for row in form_rows]
+            return forms
+
+    def _insert_rules(self, form_id: int, form: Mapping[str, Any]):
+        conn = self._conn
+        for position, rule in enumerate(form.get("calculationRules", [])):
+            rule_id = conn.execute(
+                "INSERT INTO calculation_rules (form_id, position, extra) VALUES (?, ?, ?)",
+                (form_id, position, _extra(rule, ("effectiveYears",) + DATE_RULE_KINDS)),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO effective_years (rule_id, position, year) VALUES (?, ?, ?)",
+                [(rule_id, i, year) for i, year in enumerate(rule.get("effectiveYears", []))],
+            )
+            for kind in DATE_RULE_KINDS:
+                date_rule = rule.get(kind)
+                if date_rule is None:
+                    continue
+                conn.execute(
+                    "INSERT INTO date_rules (rule_id, kind, months_after_calculation_base, "
+                    "months_after_year_start, day_of_month, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                    [rule_id, kind] + _offset_values(date_rule) + [
+                        _extra(date_rule, [key for key, _ in OFFSET_COLUMNS] + ["fiscalYearExceptions"])
+                    ],
+                )
+                conn.executemany(
+                    "INSERT INTO fiscal_year_exceptions (rule_id, kind, month, months_after_calculation_base, "
+                    "months_after_year_start, day_of_month, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        [rule_id, kind, month] + _offset_values(exception)
+                        + [_extra(exception, [key for key, _ in OFFSET_COLUMNS])]
+                        for month, exception in date_rule.get("fiscalYearExceptions", {}).items()
+                    ],
+                )
+
+    def _form_values(self, form: Mapping[str, Any]) -> List[Any]:
+        values = [form.get(key) for key, _ in FORM_COLUMNS]
+        for key, _ in FORM_JSON_COLUMNS:
+            values.append(json.dumps(thaw(form[key])) if key in form else None)
+        known = [key for key, _ in FORM_COLUMNS + FORM_JSON_COLUMNS] + ["calculationRules", "id"]
+        values.append(_extra(form, known))
+        return values
+
+    def _insert_form(self, form: Mapping[str, Any]) -> int:
+        columns = [column for _, column in FORM_COLUMNS + FORM_JSON_COLUMNS] + ["extra"]
+        form_id = self._conn.execute(
+            f"INSERT INTO forms ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            self._form_values(form),
+        ).lastrowid
+        self._insert_rules(form_id, form)
+        return form_id
+
+    def _update_form(self, form_id: int, form: Mapping[str, Any]):
+        columns = [column for _, column in FORM_COLUMNS + FORM_JSON_COLUMNS] + ["extra"]
+        self._conn.execute(
+            f"UPDATE forms SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+            self._form_values(form) + [form_id],
+        )
+        # Rules cascade to their years, date rules and exceptions
+        self._conn.execute("DELETE FROM calculation_rules WHERE form_id = ?", (form_id,))
+        self._insert_rules(form_id, form)
+
+    def _splice(self, f: IO[str], change: FormChange, expected_signature: Tuple[int, ...]) -> bool:
+        """Write the current file with change applied to f; False (and f emptied) if it cannot be parsed."""
+        try:
+            with open(self.json_path, "r") as source:
+                st = os.fstat(source.fileno())
+                if (st.st_ino, st.st_dev, st.st_mtime_ns, st.st_size) != expected_signature:
+                    raise StaleWriteError(f"{self.location} changed since it was read")
+                splice_json_forms(source, f, change)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Rewriting all of {self.json_path}: {e}")
+            f.seek(0)
+            f.truncate()
+            return False
+
+    def save(
+        self,
+        forms: Iterable[Mapping[str, Any]],
+        change: Optional[FormChange] = None,
+        expected_signature: Optional[Tuple[int, ...]] = None
+    ) -> SavedCatalog:
+        """Persist the catalog, writing only the changed form's rows when possible.
+
+        If expected_signature is given and another writer has committed
+        since, the transaction is rolled back with StaleWriteError. Returns
+        the version this transaction committed.
+        """
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+                if expected_signature is not None and (version[0],) != expected_signature:
+                    raise StaleWriteError(f"{self.location} changed since it was read")
+
+                row_ids = list(self._row_ids)
+                if change is None:
+                    conn.execute("DELETE FROM forms")
+                    row_ids = [self._insert_form(form) for form in forms]
+                elif change.op == "add":
+                    # New rows get the highest id, so they always land at the end
+                    row_ids.append(self._insert_form(change.form))
+                elif change.op == "update":
+                    self._update_form(row_ids[change.position], change.form)
+                elif change.op == "delete":
+                    conn.execute("DELETE FROM forms WHERE id = ?", (row_ids.pop(change.position),))
+                else:
+                    raise ValueError(f"Unknown change: {change.op}")
+                conn.execute("UPDATE catalog_meta SET value = value + 1 WHERE key = 'version'")
+                version = conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._row_ids = row_ids
+        return SavedCatalog((version[0],))
+
+
+def default_store(json_path: Optional[str] = None):
+    """Get the store for the app: SQLite when FORMS_DB_PATH is set, else forms.json."""
+    db_path = os.environ.get("FORMS_DB_PATH")
+    if db_path and json_path is None:
+        return SqliteFormsStore(db_path)
+    return JsonFormsStore(json_path or DEFAULT_FORMS_PATH)
+
+
+def import_json(json_path: str, db_path: str) -> int:
+    """Load a forms.json file into a SQLite store, replacing its contents."""
+    store = SqliteFormsStore(db_path)
+    try:
+        # Forms are inserted as they are read from the file
+        store.save(JsonFormsStore(json_path).iter_forms())
+        return len(store._row_ids)
+    finally:
+        store.close()
+
+
+def export_json(db_path: str, json_path: str) -> int:
+    """Write a SQLite store's catalog out in the forms.json layout."""
+    store = SqliteFormsStore(db_path)
+    try:
+        forms = store.load()
+    finally:
+        store.close()
+    JsonFormsStore(json_path).save(forms)
+    return len(forms)
@@ -0,0 +1,217 @@
+# tax_forms/backend/holiday_calendar.py
+import hashlib
+import threading
+from array import array
+from datetime import date, timedelta
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = range(7)
+
+# How far past December 31 a year's lookup table reaches, so a roll that
+# starts late in the year can land in January without a second lookup
+_TAIL_DAYS = 16
+
+
+def easter_sunday(year: int) -> date:
+    """Western Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+class HolidayRule(NamedTuple):
+    """A holiday defined by a fixed date, an nth weekday or an offset from Easter.
+
+    nth counts from the start of the month (1 = first) or from its end
+    (-1 = last). Observed holidays falling on Saturday move to Friday and
+    those falling on Sunday move to Monday.
+    """
+    name: str
+    month: int = 0
+    day: int = 0
+    weekday: Optional[int] = None
+    nth: int = 0
+    easter_offset: Optional[int] = None
+    observed: bool = True
+    since: int = 0
+
+    def date_for(self, year: int) -> Optional[date]:
+        """Get the date the holiday is observed on in a year."""
+        if year < self.since:
+            return None
+
+        if self.easter_offset is not None:
+            return easter_sunday(year) + timedelta(days=self.easter_offset)
+
+        if self.weekday is not None:
+            if self.nth > 0:
+                first = date(year, self.month, 1)
+                shift = (self.weekday - first.weekday()) % 7
+                return first + timedelta(days=shift + 7 * (self.nth - 1))
+            next_month = date(year + self.month // 12, self.month % 12 + 1, 1)
+            last = next_month - timedelta(days=1)
+            shift = (last.weekday() - self.weekday) % 7
+            return last - timedelta(days=shift + 7 * (-self.nth - 1))
+
+        holiday = date(year, self.month, self.day)
+        if self.observed:
+            if holiday.weekday() == SATURDAY:
+                return holiday - timedelta(days=1)
+            if holiday.weekday() == SUNDAY:
+                return holiday + timedelta(days=1)
+        return holiday
+
+
+# Legal holidays in the District of Columbia, which govern federal deadlines
+FEDERAL_HOLIDAYS: Tuple[HolidayRule, ...] = (
+    HolidayRule("New Year's Day", month=1, day=1),
+    HolidayRule("Martin Luther King Jr. Day", month=1, weekday=MONDAY, nth=3, since=1986),
+    HolidayRule("Washington's Birthday", month=2, weekday=MONDAY, nth=3),
+    HolidayRule("DC Emancipation Day", month=4, day=16, since=2005),
+    HolidayRule("Memorial Day", month=5, weekday=MONDAY, nth=-1),
+    HolidayRule("Juneteenth", month=6, day=19, since=2021),
+    HolidayRule("Independence Day", month=7, day=4),
+    HolidayRule("Labor Day", month=9, weekday=MONDAY, nth=1),
+    HolidayRule("Columbus Day", month=10, weekday=MONDAY, nth=2),
+    HolidayRule("Veterans Day", month=11, day=11),
+    HolidayRule("Thanksgiving Day", month=11, weekday=THURSDAY, nth=4),
+    HolidayRule("Christmas Day", month=12, day=25),
+)
+
+# State holidays that move filing deadlines, in addition to the federal ones
+STATE_HOLIDAYS: Dict[str, Tuple[HolidayRule, ...]] = {
+    "California": (
+        HolidayRule("Cesar Chavez Day", month=3, day=31),
+    ),
+    "Maine": (
+        HolidayRule("Patriots' Day", month=4, weekday=MONDAY, nth=3),
+    ),
+    "Massachusetts": (
+        HolidayRule("Patriots' Day", month=4, weekday=MONDAY, nth=3),
+    ),
+    "Tennessee": (
+        HolidayRule("Good Friday", easter_offset=-2),
+    ),
+    "Texas": (
+        HolidayRule("Texas Independence Day", month=3, day=2, observed=False),
+        HolidayRule("San Jacinto Day", month=4, day=21, observed=False),
+    ),
+}
+
+
+class HolidayCalendar:
+    """Business-day calendar with a precomputed next-business-day table per year."""
+
+    def __init__(self, name: str, rules: Iterable[HolidayRule]):
+        self.name = name
+        self.rules = tuple(rules)
+        self._lock = threading.Lock()
+        self._holidays: Dict[int, FrozenSet[date]] = {}
+        self._tables: Dict[int, Tuple[int, array]] = {}
+
+    def __repr__(self) -> str:
+        return f"HolidayCalendar({self.name!r})"
+
+    def holidays(self, year: int) -> FrozenSet[date]:
+        """Get the observed holiday dates generated by a year's rules."""
+        holidays = self._holidays.get(year)
+        if holidays is None:
+            holidays = frozenset(
+                holiday for holiday in (rule.date_for(year) for rule in self.rules) if holiday
+            )
+            self._holidays[year] = holidays
+        return holidays
+
+    def is_business_day(self, day: date) -> bool:
+        """Check whether a date is neither a weekend nor a holiday."""
+        return day.weekday() < SATURDAY and day not in self._holidays_near(day.year)
+
+    def _holidays_near(self, year: int) -> FrozenSet[date]:
+        # Observed dates can cross a year boundary (New Year's Day on a Saturday)
+        return self.holidays(year - 1) | self.holidays(year) | self.holidays(year + 1)
+
+    def _year_table(self, year: int) -> Tuple[int, array]:
+        """Days to the next business day for every date of a year (plus a short tail)."""
+        table = self._tables.get(year)
+        if table is not None:
+            return table
+
+        with self._lock:
+            table = self._tables.get(year)
+            if table is not None:
+                return table
+
+            start = date(year, 1, 1).toordinal()
+            length = date(year + 1, 1, 1).toordinal() - start + _TAIL_DAYS
+            holidays = {
+                holiday.toordinal()
+                for holiday in self.holidays(year) | self.holidays(year + 1)
+            }
+
+            offsets = array("B", bytes(length))
+            next_business = None
+            # Walk backwards so each day only needs its successor's answer
+            for index in range(length - 1, -1, -1):
+                ordinal = start + index
+                # date.toordinal() is 1 on Monday 0001-01-01
+                if (ordinal - 1) % 7 < SATURDAY and ordinal not in holidays:
+                    next_business = ordinal
+                offsets[index] = next_business - ordinal if next_business is not None else 0
+
+            table = (start, offsets)
+            self._tables[year] = table
+            return table
+
+    def roll_forward(self, day: date) -> date:
+        """Move a date forward to the next business day (unchanged if it is one)."""
+        start, offsets = self._year_table(day.year)
+        ordinal = day.toordinal()
+        shift = offsets[ordinal - start]
+        return date.fromordinal(ordinal + shift) if shift else day
+
+    def holiday_dates(self, first_year: int, last_year: int) -> List[date]:
+        """Sorted holidays for a range of years (padded by a year on each side)."""
+        days = set()
+        for year in range(first_year - 1, last_year + 2):
+            days |= self.holidays(year)
+        return sorted(days)
+
+
+FEDERAL_CALENDAR = HolidayCalendar("United States", FEDERAL_HOLIDAYS)
+
+_state_calendars: Dict[str, HolidayCalendar] = {}
+_state_calendars_lock = threading.Lock()
+
+
+def get_holiday_calendar(locality_type: Optional[str] = None, locality: Optional[str] = None) -> HolidayCalendar:
+    """Get the calendar for a form's locality.
+
+    State and city forms use the federal holidays plus their state's
+    holidays; anything without state holidays on file uses the federal
+    calendar.
+    """
+    if locality_type == "federal" or locality not in STATE_HOLIDAYS:
+        return FEDERAL_CALENDAR
+
+    calendar = _state_calendars.get(locality)
+    if calendar is None:
+        with _state_calendars_lock:
+            calendar = _state_calendars.get(locality)
+            if calendar is None:
+                calendar = HolidayCalendar(locality, FEDERAL_HOLIDAYS + STATE_HOLIDAYS[locality])
+                _state_calendars[locality] = calendar
+    return calendar
+
+
+def calendars_fingerprint() -> str:
+    """sha256 of every calendar's holiday rules, to tell when tables built from them are stale."""
+    rules = (FEDERAL_CALENDAR.name, FEDERAL_HOLIDAYS, sorted(STATE_HOLIDAYS.items()))
+    return hashlib.sha256(repr(rules).encode("utf-8")).hexdigest()
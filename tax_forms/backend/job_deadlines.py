@@ -0,0 +1,618 @@
+# tax_forms/backend/job_deadlines.py
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .due_date_batch import calculate_pairs
+from .due_date_engine import CompiledRule
+from .form_index import FormKey, form_key, get_form_index
+from .forms_catalog import CatalogSnapshot, FormsCatalog, get_catalog
+from .forms_store import DEFAULT_FORMS_PATH, StaleWriteError
+from .rule_index import FormRuleTable, compile_form_rules
+
+DEFAULT_JOBS_PATH = os.path.join(os.path.dirname(DEFAULT_FORMS_PATH), "jobs.db")
+
+# Same tables as the Job and JobForm models; dates are ISO strings, as
+# SQLAlchemy's Date type stores them in SQLite
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    coverage_start_date DATE NOT NULL,
+    coverage_end_date DATE NOT NULL,
+    entity_type TEXT
+);
+CREATE TABLE IF NOT EXISTS job_forms (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    form_number TEXT,
+    entity_type TEXT,
+    locality_type TEXT,
+    locality TEXT,
+    due_date DATE,
+    extension_due_date DATE
+);
+"""
+
+# JobForm indexes by name; a full recompute drops them and builds them again
+# after the insert, which is much faster than updating them row by row
+JOB_FORM_INDEXES = {
+    "job_forms_job": "job_forms(job_id)",
+    "job_forms_form": "job_forms(form_number, entity_type, locality_type, locality)",
+}
+JOB_SCHEMA += "".join(
+    f"CREATE INDEX IF NOT EXISTS {name} ON {columns};\n" for name, columns in JOB_FORM_INDEXES.items()
+)
+
+# Inclusive (first, last) tax years; None leaves that end open
+YearRange = Tuple[Optional[int], Optional[int]]
+
+# (job, form) pairs computed and inserted per executemany call
+JOB_FORM_CHUNK_SIZE = 50000
+
+
+class Job(NamedTuple):
+    """A client engagement: one entity's coverage period."""
+    id: int
+    name: str
+    coverage_start_date: date
+    coverage_end_date: date
+    entity_type: Optional[str]
+
+
+class JobsStore:
+    """Keeps jobs and their computed JobForm rows in SQLite (WAL mode)."""
+
+    def __init__(self, db_path: str = DEFAULT_JOBS_PATH):
+        self.db_path = db_path
+        self.location = os.path.abspath(db_path)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(JOB_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def add_jobs(self, jobs: Iterable[Tuple[str, date, date, Optional[str]]]) -> int:
+        """Insert (name, coverage start, coverage end, entity type) jobs; returns how many."""
+        rows = [(name, start.isoformat(), end.isoformat(), entity_type) for name, start, end, entity_type in jobs]
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO jobs (name, coverage_start_date, coverage_end_date, entity_type) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def load_jobs(self, job_ids: Optional[Sequence[int]] = None) -> List[Job]:
+        """Load jobs (all of them, or the given ids) in id order."""
+        query = "SELECT id, name, coverage_start_date, coverage_end_date, entity_type FROM jobs"
+        with self._lock:
+            if job_ids is None:
+                rows = self._conn.execute(query + " ORDER BY id").fetchall()
+            else:
+                # Look the ids up through a temp table rather than a huge IN (...)
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS selected_jobs (id INTEGER PRIMARY KEY)")
+                self._conn.execute("DELETE FROM selected_jobs")
+                self._conn.executemany("INSERT OR IGNORE INTO selected_jobs VALUES (?)", [(i,) for i in job_ids])
+                rows = self._conn.execute(
+                    query + " WHERE id IN (SELECT id FROM selected_jobs) ORDER BY id"
+                ).fetchall()
+        return [
+            Job(job_id, name, date.fromisoformat(start), date.fromisoformat(end), entity_type)
+            for job_id, name, start, end, entity_type in rows
+        ]
+
+    def job_forms(self, job_id: int) -> List[Tuple[Any, ...]]:
+        """The JobForm rows of a job, without their ids."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT form_number, entity_type, locality_type, locality, due_date, extension_due_date "
+                "FROM job_forms WHERE job_id = ? ORDER BY id",
+                (job_id,),
+            ).fetchall()
+
+    def form_rows(self, key: FormKey, years: Sequence[YearRange]) -> List[Tuple[Any, ...]]:
+        """JobForm rows of a form whose job's tax year (coverage end year) is in years.
+
+        Returns (job form id, job id, coverage start, coverage end, due date,
+        extension due date) rows found through the job_forms_form index.
+        """
+        query = (
+            "SELECT job_forms.id, job_id, coverage_start_date, coverage_end_date, due_date, extension_due_date "
+            "FROM job_forms JOIN jobs ON jobs.id = job_id "
+            "WHERE form_number IS ? AND job_forms.entity_type IS ? AND locality_type IS ? AND locality IS ?"
+        )
+        rows = []
+        with self._lock:
+            for first_year, last_year in years:
+                bounds = []
+                condition = ""
+                if first_year is not None:
+                    condition += " AND coverage_end_date >= ?"
+                    bounds.append(f"{first_year:04d}-01-01")
+                if last_year is not None:
+                    condition += " AND coverage_end_date <= ?"
+                    bounds.append(f"{last_year:04d}-12-31")
+                rows.extend(self._conn.execute(query + condition, list(key) + bounds).fetchall())
+        rows.sort()
+        return rows
+
+    def jobs_of_entity_type(self, entity_type: Optional[str]) -> List[Job]:
+        """Jobs whose forms are those of an entity type."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, coverage_start_date, coverage_end_date, entity_type FROM jobs "
+                "WHERE entity_type IS ? ORDER BY id",
+                (entity_type,),
+            ).fetchall()
+        return [
+            Job(job_id, name, date.fromisoformat(start), date.fromisoformat(end), job_entity_type)
+            for job_id, name, start, end, job_entity_type in rows
+        ]
+
+    def apply_form_change(
+        self,
+        updates: Sequence[Tuple[Any, ...]],
+        deleted: Sequence[int] = (),
+        inserted: Sequence[Tuple[Any, ...]] = (),
+    ):
+        """Write the JobForm rows touched by a form edit in one transaction.
+
+        updates are (form number, entity type, locality type, locality, due
+        date, extension due date, job form id); inserted rows are laid out
+        as in replace_job_forms.
+        """
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE job_forms SET form_number = ?, entity_type = ?, locality_type = ?, locality = ?, "
+                    "due_date = ?, extension_due_date = ? WHERE id = ?",
+                    updates,
+                )
+                conn.executemany("DELETE FROM job_forms WHERE id = ?", [(row_id,) for row_id in deleted])
+                conn.executemany(
+                    "INSERT INTO job_forms (job_id, form_number, entity_type, locality_type, locality, "
+                    "due_date, extension_due_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    inserted,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def replace_job_forms(self, job_ids: Optional[Sequence[int]], chunks: Iterable[List[Tuple[Any, ...]]]) -> int:
+        """Swap the JobForm rows of jobs (None: every JobForm row) for fresh ones in one transaction.
+
+        Readers keep seeing the previous rows until the commit.
+        """
+        count = 0
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if job_ids is None:
+                    for name in JOB_FORM_INDEXES:
+                        conn.execute(f"DROP INDEX IF EXISTS {name}")
+                    # Without indexes SQLite empties the table in one step
+                    conn.execute("DELETE FROM job_forms")
+                else:
+                    conn.executemany("DELETE FROM job_forms WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+                for rows in chunks:
+                    conn.executemany(
+                        "INSERT INTO job_forms (job_id, form_number, entity_type, locality_type, locality, "
+                        "due_date, extension_due_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    count += len(rows)
+                if job_ids is None:
+                    for name, columns in JOB_FORM_INDEXES.items():
+                        conn.execute(f"CREATE INDEX {name} ON {columns}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+
+_jobs_store: Optional[JobsStore] = None
+_jobs_store_lock = threading.Lock()
+
+
+def get_jobs_store() -> Optional[JobsStore]:
+    """The app's jobs database (JOBS_DB_PATH, else assets/jobs.db), or None if there is none yet."""
+    global _jobs_store
+    if _jobs_store is None:
+        db_path = os.environ.get("JOBS_DB_PATH") or DEFAULT_JOBS_PATH
+        if not os.path.exists(db_path):
+            return None
+        with _jobs_store_lock:
+            if _jobs_store is None:
+                _jobs_store = JobsStore(db_path)
+    return _jobs_store
+
+
+def _iso_dates(dates: np.ndarray) -> List[Optional[str]]:
+    """datetime64[D] values as ISO date strings, NaT as None."""
+    strings = np.datetime_as_string(dates, unit="D").astype(object)
+    strings[np.isnat(dates)] = None
+    return strings.tolist()
+
+
+class JobFormDates(NamedTuple):
+    """Dates computed for (job, form) pairs: job numbers, catalog positions and dates."""
+    jobs: np.ndarray
+    forms: np.ndarray
+    due_dates: np.ndarray
+    extension_due_dates: np.ndarray
+
+
+def _job_form_dates(
+    snapshot: CatalogSnapshot,
+    entity_types: Sequence[Optional[str]],
+    starts: np.ndarray,
+    ends: np.ndarray,
+    chunk_size: int,
+) -> Iterator[JobFormDates]:
+    """Dates for every job (given as columns) x each form of its entity type.
+
+    Each chunk is one vectorized calculate_pairs call, so jobs with
+    different fiscal year ends are computed together.
+    """
+    by_entity_type = get_form_index(snapshot).by_entity_type
+    pair_jobs = []
+    pair_forms = []
+    for job_number, entity_type in enumerate(entity_types):
+        positions = by_entity_type.get(entity_type, [])
+        pair_jobs.append(np.full(len(positions), job_number, dtype=np.int64))
+        pair_forms.append(np.asarray(positions, dtype=np.int64))
+    if not pair_jobs:
+        return
+    pair_jobs = np.concatenate(pair_jobs)
+    pair_forms = np.concatenate(pair_forms)
+
+    for start in range(0, len(pair_jobs), chunk_size):
+        chunk_jobs = pair_jobs[start:start + chunk_size]
+        chunk_forms = pair_forms[start:start + chunk_size]
+        dates = calculate_pairs(snapshot, chunk_forms, starts[chunk_jobs], ends[chunk_jobs])
+        yield JobFormDates(chunk_jobs, chunk_forms, dates.due_dates, dates.extension_due_dates)
+
+
+def _job_columns(jobs: Sequence[Job]) -> Tuple[np.ndarray, List[Optional[str]], np.ndarray, np.ndarray]:
+    """Ids, entity types, coverage starts and coverage ends of jobs."""
+    return (
+        np.array([job.id for job in jobs], dtype=np.int64),
+        [job.entity_type for job in jobs],
+        np.array([job.coverage_start_date for job in jobs], dtype="datetime64[D]"),
+        np.array([job.coverage_end_date for job in jobs], dtype="datetime64[D]"),
+    )
+
+
+class _RowBuilder:
+    """Turns computed dates into JobForm rows for a snapshot's forms."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        forms = snapshot.forms
+        # Per-position columns, gathered for every pair with one take each
+        self.columns = [
+            np.array([form.get(key) for form in forms], dtype=object)
+            for key in ("formNumber", "entityType", "localityType", "locality")
+        ]
+
+    def rows(self, job_ids: np.ndarray, dates: JobFormDates) -> List[Tuple[Any, ...]]:
+        """Rows for dates, whose job numbers index job_ids."""
+        return list(zip(
+            job_ids[dates.jobs].tolist(),
+            *(column[dates.forms].tolist() for column in self.columns),
+            _iso_dates(dates.due_dates),
+            _iso_dates(dates.extension_due_dates),
+        ))
+
+
+def job_form_rows(
+    snapshot: CatalogSnapshot, jobs: Sequence[Job], chunk_size: int = JOB_FORM_CHUNK_SIZE
+) -> Iterator[List[Tuple[Any, ...]]]:
+    """Compute the JobForm rows of jobs, chunk_size (job, form) pairs at a time.
+
+    A job's applicable forms are the catalog forms of its entity type.
+    """
+    builder = _row_builder(snapshot)
+    job_ids, *columns = _job_columns(jobs)
+    for dates in _job_form_dates(snapshot, *columns, chunk_size):
+        yield builder.rows(job_ids, dates)
+
+
+def _row_builder(snapshot: CatalogSnapshot) -> _RowBuilder:
+    return snapshot.derived("job_row_builder", _RowBuilder)
+
+
+# Jobs per task handed to a worker process
+JOB_SHARD_SIZE = 2000
+
+_worker_catalog: Optional[FormsCatalog] = None
+
+
+def _attach_worker(json_path: Optional[str]):
+    """Load the catalog once per worker process.
+
+    For forms.json this maps the compiled catalog file (and its batch
+    tables) that the parent already wrote, so nothing is parsed or pickled.
+    """
+    global _worker_catalog
+    _worker_catalog = get_catalog(json_path)
+    _worker_catalog.snapshot()
+
+
+def _compute_shard(
+    stamp: str,
+    form_count: int,
+    job_ids: np.ndarray,
+    entity_types: List[Optional[str]],
+    starts: np.ndarray,
+    ends: np.ndarray,
+    chunk_size: int,
+) -> List[List[Tuple[Any, ...]]]:
+    """A shard's finished JobForm rows, computed in a worker process."""
+    snapshot = _worker_catalog.snapshot()
+    # Positions are only meaningful against the parent's catalog
+    if snapshot.stamp != stamp or len(snapshot.forms) != form_count:
+        raise StaleWriteError("forms catalog changed during the recompute")
+    builder = _row_builder(snapshot)
+    return [
+        builder.rows(job_ids, dates) for dates in _job_form_dates(snapshot, entity_types, starts, ends, chunk_size)
+    ]
+
+
+def parallel_job_form_rows(
+    catalog: FormsCatalog,
+    snapshot: CatalogSnapshot,
+    jobs: Sequence[Job],
+    workers: int,
+    shard_size: int = JOB_SHARD_SIZE,
+    chunk_size: int = JOB_FORM_CHUNK_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Iterator[List[Tuple[Any, ...]]]:
+    """job_form_rows, with the rows of each shard_size jobs built in a worker process.
+
+    Workers compute the dates and the row tuples, leaving this process
+    only to collect them. Rows come out in job order whatever order workers
+    finish in, so the result is the same as a sequential run.
+    progress(jobs_done, total) is called as each shard's rows arrive.
+    """
+    job_ids, entity_types, starts, ends = _job_columns(jobs)
+    # Spawned rather than forked: the parent may hold locks and a watcher thread
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        workers, mp_context=context, initializer=_attach_worker,
+        initargs=(getattr(catalog.store, "json_path", None),),
+    ) as executor:
+        shards = range(0, len(jobs), shard_size)
+        results = executor.map(
+            _compute_shard,
+            repeat(snapshot.stamp),
+            repeat(len(snapshot.forms)),
+            (job_ids[start:start + shard_size] for start in shards),
+            (entity_types[start:start + shard_size] for start in shards),
+            (starts[start:start + shard_size] for start in shards),
+            (ends[start:start + shard_size] for start in shards),
+            repeat(chunk_size),
+        )
+        for start, shard in zip(shards, results):
+            yield from shard
+            if progress is not None:
+                progress(min(start + shard_size, len(jobs)), len(jobs))
+
+
+def _report_done(
+    rows: Iterator[List[Tuple[Any, ...]]], total: int, progress: Callable[[int, int], None]
+) -> Iterator[List[Tuple[Any, ...]]]:
+    yield from rows
+    progress(total, total)
+
+
+def recompute_job_forms(
+    store: JobsStore,
+    job_ids: Optional[Sequence[int]] = None,
+    catalog: Optional[FormsCatalog] = None,
+    chunk_size: int = JOB_FORM_CHUNK_SIZE,
+    workers: int = 1,
+    shard_size: int = JOB_SHARD_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Recompute the JobForm rows of every job (or the given ones); returns the row count.
+
+    Meant for the nightly run over the whole client book: dates come from
+    the NumPy batch engine and rows go in with chunked executemany calls.
+    With workers > 1, rows are built in that many processes (use
+    os.cpu_count() for the whole machine) and collected before the write
+    transaction opens, so other writers are only blocked for the insert.
+    """
+    catalog = catalog or get_catalog()
+    snapshot = catalog.snapshot()
+    jobs = store.load_jobs(job_ids)
+    if workers > 1 and len(jobs) > shard_size:
+        rows = list(parallel_job_form_rows(catalog, snapshot, jobs, workers, shard_size, chunk_size, progress))
+    else:
+        rows = job_form_rows(snapshot, jobs, chunk_size)
+        if progress is not None:
+            rows = _report_done(rows, len(jobs), progress)
+    return store.replace_job_forms([job.id for job in jobs] if job_ids is not None else None, rows)
+
+
+class DeadlineChange(NamedTuple):
+    """A client deadline changed by a form edit (dates as ISO strings, None if none)."""
+    job_id: int
+    form_number: str
+    old_due_date: Optional[str]
+    due_date: Optional[str]
+    old_extension_due_date: Optional[str]
+    extension_due_date: Optional[str]
+
+
+def _year_effects(table: Optional[FormRuleTable]) -> Callable[[int], Any]:
+    """What a form's rules do in a tax year: its due and extension offsets by base month."""
+    compiled: Dict[int, Any] = {}
+
+    def effect(tax_year: int) -> Any:
+        if table is None:
+            return None
+        rule = table.resolve(tax_year).rule
+        result = compiled.get(id(rule))
+        if result is None:
+            rule_dates = CompiledRule(rule)
+            result = compiled[id(rule)] = (rule_dates.due.by_month, rule_dates.extension.by_month)
+        return result
+
+    return effect
+
+
+def affected_years(old_form: Mapping[str, Any], new_form: Mapping[str, Any]) -> List[YearRange]:
+    """Tax years whose due or extension dates differ between two versions of a form.
+
+    Rules are compared by their compiled per-month offsets, so reordering
+    rules or rewording an equivalent rule affects nothing. Years before
+    (after) every listed year resolve like the first (last) of them.
+    """
+    if any(old_form.get(key) != new_form.get(key) for key in ("calculationBase", "localityType", "locality")):
+        return [(None, None)]
+    old_table = compile_form_rules(old_form.get("calculationRules", []))
+    new_table = compile_form_rules(new_form.get("calculationRules", []))
+    if old_table is None or new_table is None:
+        return [] if old_table is new_table else [(None, None)]
+
+    old_effect, new_effect = _year_effects(old_table), _year_effects(new_table)
+    first = min(old_table.years[0], new_table.years[0])
+    last = max(old_table.years[-1], new_table.years[-1])
+    ranges: List[List[Optional[int]]] = []
+    for year in range(first - 1, last + 2):
+        if old_effect(year) == new_effect(year):
+            continue
+        if ranges and ranges[-1][1] == year - 1:
+            ranges[-1][1] = year
+        else:
+            ranges.append([year, year])
+    # The years just outside the listed span stand for everything beyond it
+    if ranges and ranges[0][0] == first - 1:
+        ranges[0][0] = None
+    if ranges and ranges[-1][1] == last + 1:
+        ranges[-1][1] = None
+    return [(first_year, last_year) for first_year, last_year in ranges]
+
+
+def recompute_form_change(
+    store: JobsStore,
+    old_form: Mapping[str, Any],
+    position: int,
+    catalog: Optional[FormsCatalog] = None,
+) -> List[DeadlineChange]:
+    """Update the JobForm rows affected by an edit of the form now at position.
+
+    Only rows of the edited form in the affected tax years are looked up
+    (by form key and year) and recomputed, and only rows whose dates moved
+    are reported. Rows are matched by form key, which the catalog treats
+    as unique. If the entity type changed, the form's rows move from the
+    old entity type's jobs to the new one's.
+    """
+    snapshot = (catalog or get_catalog()).snapshot()
+    new_form = snapshot.forms[position]
+    old_key, new_key = form_key(old_form), form_key(new_form)
+    changes: List[DeadlineChange] = []
+
+    if old_key[1] != new_key[1]:
+        deleted = store.form_rows(old_key, [(None, None)])
+        for _, job_id, _, _, due_date, extension_due_date in deleted:
+            changes.append(DeadlineChange(job_id, old_key[0], due_date, None, extension_due_date, None))
+        jobs = store.jobs_of_entity_type(new_key[1])
+        _, _, starts, ends = _job_columns(jobs)
+        dates = calculate_pairs(snapshot, np.full(len(jobs), position, dtype=np.int64), starts, ends)
+        due_dates, extension_due_dates = _iso_dates(dates.due_dates), _iso_dates(dates.extension_due_dates)
+        inserted = []
+        for job, due_date, extension_due_date in zip(jobs, due_dates, extension_due_dates):
+            inserted.append((job.id,) + new_key + (due_date, extension_due_date))
+            changes.append(DeadlineChange(job.id, new_key[0], None, due_date, None, extension_due_date))
+        store.apply_form_change([], [row[0] for row in deleted], inserted)
+        return changes
+
+    # Rows keyed by the old key all need the new key, whatever their dates
+    years = [(None, None)] if old_key != new_key else affected_years(old_form, new_form)
+    rows = store.form_rows(old_key, years) if years else []
+    if not rows:
+        return changes
+
+    starts = np.array([row[2] for row in rows], dtype="datetime64[D]")
+    ends = np.array([row[3] for row in rows], dtype="datetime64[D]")
+    dates = calculate_pairs(snapshot, np.full(len(rows), position, dtype=np.int64), starts, ends)
+    updates = []
+    for row, due_date, extension_due_date in zip(
+        rows, _iso_dates(dates.due_dates), _iso_dates(dates.extension_due_dates)
+    ):
+        row_id, job_id, _, _, old_due_date, old_extension_due_date = row
+        dates_changed = (due_date, extension_due_date) != (old_due_date, old_extension_due_date)
+        if dates_changed:
+            changes.append(DeadlineChange(
+                job_id, new_key[0], old_due_date, due_date, old_extension_due_date, extension_due_date
+            ))
+        if dates_changed or old_key != new_key:
+            updates.append(new_key + (due_date, extension_due_date, row_id))
+    if updates:
+        store.apply_form_change(updates)
+    return changes
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Recompute the JobForm rows from the command line (the nightly run)."""
+    parser = argparse.ArgumentParser(
+        prog="python -m tax_forms.backend.job_deadlines",
+        description="Recompute every job's form deadlines from the forms catalog.",
+    )
+    parser.add_argument(
+        "--db", default=os.environ.get("JOBS_DB_PATH") or DEFAULT_JOBS_PATH,
+        help="jobs database, created if missing (default: JOBS_DB_PATH or assets/jobs.db)",
+    )
+    parser.add_argument("--jobs", type=int, nargs="+", metavar="ID", help="only recompute these jobs")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes computing dates (default: 1, 0 for every CPU)"
+    )
+    parser.add_argument(
+        "--shard-size", type=int, default=JOB_SHARD_SIZE, help="jobs per task handed to a worker process"
+    )
+    parser.add_argument("--chunk-size", type=int, default=JOB_FORM_CHUNK_SIZE, help="rows per insert batch")
+    args = parser.parse_args(argv)
+
+    def report(done: int, total: int):
+        print(f"{done}/{total} jobs", flush=True)
+
+    store = JobsStore(args.db)
+    try:
+        count = recompute_job_forms(
+            store, args.jobs, chunk_size=args.chunk_size, workers=args.workers or os.cpu_count() or 1,
+            shard_size=args.shard_size, progress=report,
+        )
+    finally:
+        store.close()
+    print(f"Wrote {count} JobForm rows to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# tax_forms/backend/rule_index.py
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+from .forms_catalog import CatalogChange, CatalogSnapshot, carry_derived
+
+
+class ResolvedRule(NamedTuple):
+    """A calculation rule chosen for a tax year."""
+    rule: Mapping[str, Any]
+    approximated: bool
+
+
+class FormRuleTable:
+    """Rules of a single form, sorted by the tax years they list.
+
+    A year is resolved by bisecting the sorted years: a listed year gets
+    its own rule, any other year the rule of the closest listed year
+    (flagged as approximated). When two listed years are equally close,
+    the one listed first in calculationRules wins. The ResolvedRule
+    results are built once here, so resolving never copies a rule.
+    """
+
+    __slots__ = ("years", "exact", "approximate", "listed_order")
+
+    def __init__(self, exact_rules: Mapping[int, Mapping[str, Any]]):
+        # exact_rules is in the order years were first listed
+        self.listed_order = tuple(sorted(range(len(exact_rules)), key=list(exact_rules).__getitem__))
+        self.years = tuple(sorted(exact_rules))
+        self.exact = tuple(ResolvedRule(exact_rules[year], False) for year in self.years)
+        self.approximate = tuple(ResolvedRule(resolved.rule, True) for resolved in self.exact)
+
+    @property
+    def first_year(self) -> int:
+        return self.years[0]
+
+    def resolve(self, tax_year: int) -> ResolvedRule:
+        """Get the rule for a tax year, approximating with the closest year."""
+        years = self.years
+        upper = bisect_left(years, tax_year)
+        if upper < len(years) and years[upper] == tax_year:
+            return self.exact[upper]
+        if upper == 0:
+            return self.approximate[0]
+        lower = upper - 1
+        if upper == len(years):
+            return self.approximate[lower]
+        below, above = tax_year - years[lower], years[upper] - tax_year
+        if below < above or (below == above and self.listed_order[lower] < self.listed_order[upper]):
+            return self.approximate[lower]
+        return self.approximate[upper]
+
+    def by_year(self) -> Tuple[ResolvedRule, ...]:
+        """The resolved rule of every year from the first listed year to the last."""
+        return tuple(self.resolve(year) for year in range(self.years[0], self.years[-1] + 1))
+
+
+def compile_form_rules(calculation_rules: Iterable[Mapping[str, Any]]) -> Optional[FormRuleTable]:
+    """Compile a form's calculationRules into a per-year lookup table.
+
+    A year listed by several rules belongs to the first of them. Years not
+    listed by any rule use the rule of the closest listed year; when two
+    years are equally close, the one listed first wins.
+    """
+    exact: Dict[int, Mapping[str, Any]] = {}
+    for rule in calculation_rules:
+        for year in rule.get("effectiveYears", []):
+            exact.setdefault(year, rule)
+
+    if not exact:
+        return None
+    return FormRuleTable(exact)
+
+
+class RuleIndex:
+    """Compiled calculation rules for every form in a catalog snapshot."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.version = snapshot.version
+        self.tables: Tuple[Optional[FormRuleTable], ...] = tuple(
+            compile_form_rules(form.get("calculationRules", [])) for form in snapshot.forms
+        )
+
+    def with_change(self, snapshot: CatalogSnapshot, change: CatalogChange) -> "RuleIndex":
+        """A copy for snapshot that only compiles the rules of the changed forms."""
+        start, old_stop, new_stop = change
+        index = RuleIndex.__new__(RuleIndex)
+        index.version = snapshot.version
+        index.tables = self.tables[:start] + tuple(
+            compile_form_rules(form.get("calculationRules", [])) for form in snapshot.forms[start:new_stop]
+        ) + self.tables[old_stop:]
+        return index
+
+    def resolve(self, form_index: int, tax_year: int) -> Optional[ResolvedRule]:
+        """Get the rule for the form at form_index (0-based) and a tax year."""
+        table = self.tables[form_index]
+        if table is None:
+            return None
+        return table.resolve(tax_year)
+
+
+def get_rule_index(snapshot: CatalogSnapshot) -> RuleIndex:
+    """Get the rule index for a snapshot, compiling it once per catalog version."""
+    return snapshot.derived("rule_index", RuleIndex)
+
+
+carry_derived("rule_index", lambda index, previous, snapshot, change: index.with_change(snapshot, change))
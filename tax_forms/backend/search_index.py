@@ -0,0 +1,116 @@
+# tax_forms/backend/search_index.py
+import re
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Longest n-gram indexed; longer queries intersect the postings of their n-grams
+GRAM_SIZE = 3
+
+# Intersect at most this many posting lists, then verify the candidates
+MAX_INTERSECTED = 4
+
+# Ranks of a match, best first
+EXACT, NUMBER_PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+
+# Joins a form's fields so one substring test covers all of them
+_SEPARATOR = "\x00"
+
+
+def _grams(value: str) -> set:
+    """Every substring of value up to GRAM_SIZE characters long, within a field."""
+    grams = {
+        value[start:start + size]
+        for size in range(1, GRAM_SIZE + 1)
+        for start in range(len(value) - size + 1)
+    }
+    return {gram for gram in grams if _SEPARATOR not in gram}
+
+
+class SearchIndex:
+    """Inverted n-gram index over the searchable columns of a snapshot.
+
+    Every 1- to 3-character substring of a form's fields maps to the sorted
+    positions of the forms containing it. A query looks up its own n-grams,
+    intersects the shortest posting lists and then confirms each candidate
+    with a real substring test, so results are exactly those of a scan.
+    """
+
+    def __init__(self, columns: Sequence[Sequence[str]]):
+        """Index lowercased columns; the first one must be the form number."""
+        self.columns = columns
+        self.size = len(columns[0]) if columns else 0
+        # Wrapped in separators too, so exact field matches are a substring test
+        self.joined = tuple(_SEPARATOR + _SEPARATOR.join(values) + _SEPARATOR for values in zip(*columns))
+
+        postings: Dict[str, List[int]] = {}
+        for position, joined in enumerate(self.joined):
+            for gram in _grams(joined):
+                bucket = postings.get(gram)
+                if bucket is None:
+                    postings[gram] = [position]
+                else:
+                    bucket.append(position)
+        self.postings: Dict[str, array] = {gram: array("I", bucket) for gram, bucket in postings.items()}
+
+    def _candidates(self, query: str) -> Sequence[int]:
+        """Positions that contain every n-gram of the query, in catalog order."""
+        if len(query) <= GRAM_SIZE:
+            return self.postings.get(query, ())
+
+        lists = []
+        for start in range(len(query) - GRAM_SIZE + 1):
+            bucket = self.postings.get(query[start:start + GRAM_SIZE])
+            if bucket is None:
+                return ()
+            lists.append(bucket)
+        lists.sort(key=len)
+
+        shortest = lists[0]
+        if len(lists) == 1:
+            return shortest
+        return sorted(set(shortest).intersection(*lists[1:MAX_INTERSECTED]))
+
+    def substring(self, query: str, within: Optional[Sequence[int]] = None) -> List[int]:
+        """Positions of forms with a field containing the lowercased query.
+
+        within is the result of an earlier query that query contains (such
+        as the text before the last keystroke); only those forms can still
+        match, so they are filtered instead of searching the whole index.
+        """
+        if within is None:
+            candidates = self._candidates(query)
+            if len(query) <= GRAM_SIZE:
+                # The posting list is already exact
+                return list(candidates)
+        else:
+            candidates = within
+        if _SEPARATOR in query:
+            return []
+        joined = self.joined
+        return [position for position in candidates if query in joined[position]]
+
+    def ranker(self, query: str) -> Callable[[int], int]:
+        """Rank matches: exact field, form number prefix, word prefix, substring."""
+        exact = _SEPARATOR + query + _SEPARATOR
+        # A word starts after anything that is not a letter or digit
+        word_prefix = re.compile(r"(?<![^\W_])" + re.escape(query))
+        # The first column is the form number
+        numbers = self.columns[0]
+        joined = self.joined
+
+        def rank(position: int) -> int:
+            if exact in joined[position]:
+                return EXACT
+            if numbers[position].startswith(query):
+                return NUMBER_PREFIX
+            if word_prefix.search(joined[position]):
+                return WORD_PREFIX
+            return SUBSTRING
+
+        return rank
+
+    def search(self, query: str, within: Optional[Sequence[int]] = None) -> List[int]:
+        """Matching positions, best ranked first and in catalog order within a rank."""
+        return sorted(self.substring(query, within), key=self.ranker(query))
+
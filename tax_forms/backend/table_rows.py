@@ -0,0 +1,65 @@
+# tax_forms/backend/table_rows.py
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .forms_catalog import CatalogChange, CatalogSnapshot, carry_derived
+
+# Rows kept per snapshot, enough for many sessions paging back and forth
+ROW_CACHE_SIZE = 4096
+
+RowValues = Dict[str, Any]
+
+
+class RowCache:
+    """Table rows of one snapshot (fields plus due dates), shared by every session."""
+
+    def __init__(self, maxsize: int = ROW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[Tuple[int, int], RowValues]" = OrderedDict()
+
+    def rows(
+        self,
+        positions: Iterable[int],
+        year: int,
+        build: Callable[[int], RowValues],
+    ) -> List[RowValues]:
+        """Get the rows at positions for a preview year, building the ones not cached."""
+        rows = []
+        for position in positions:
+            key = (position, year)
+            with self._lock:
+                row = self._rows.get(key)
+                if row is not None:
+                    self._rows.move_to_end(key)
+            if row is None:
+                row = build(position)
+                with self._lock:
+                    self._rows[key] = row
+                    if len(self._rows) > self.maxsize:
+                        self._rows.popitem(last=False)
+            rows.append(row)
+        return rows
+
+    def with_change(self, change: CatalogChange) -> "RowCache":
+        """A copy without the changed forms' rows; rows of forms that moved get their new IDs."""
+        carried = RowCache(self.maxsize)
+        with self._lock:
+            items = list(self._rows.items())
+        for (position, year), row in items:
+            new_position = change.new_position(position)
+            if new_position is None:
+                continue
+            if new_position != position:
+                row = {**row, "id": new_position + 1}
+            carried._rows[(new_position, year)] = row
+        return carried
+
+
+def get_row_cache(snapshot: CatalogSnapshot) -> RowCache:
+    """Get the shared row cache for a snapshot; it goes away with the snapshot."""
+    return snapshot.derived("table_rows", lambda snapshot: RowCache())
+
+
+carry_derived("table_rows", lambda cache, previous, snapshot, change: cache.with_change(change))
@@ -1,16 +1,30 @@
 # tax_forms/backend/table_state.py
-import json
-import os
-from datetime import date, datetime
-from pathlib import Path
-from typing import List, Optional
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 import reflex as rx
 
+from .catalog_watch import watch_catalog
+from .due_date_engine import DueDateEngine, format_due_date, get_due_date_engine
+from .form_index import form_key_id, get_form_index, parse_form_key_id
+from .form_query import FormQuery, QueryResult, run_query
+from .forms_catalog import CatalogSnapshot, get_catalog
+from .table_rows import get_row_cache
+
+# How long typing must pause before the search runs
+SEARCH_DEBOUNCE_SECONDS = 0.15
+
+# How long an open table waits for a catalog change before re-arming the
+# wait; a closed tab stops re-arming, which ends its wait
+CATALOG_FOLLOW_SECONDS = 60
+
 
 class TaxForm(rx.Base):
     """The tax form class."""
     id: int
+    # Stable across catalog edits, unlike id (the form's position)
+    key: str
     form_number: str
     form_name: str
     entity_type: str
@@ -23,7 +37,9 @@ class TaxForm(rx.Base):
 
 class TableState(rx.State):
     """The state class."""
-    items: List[TaxForm] = []
+    # Only the rows on the current page live in session state; filtering,
+    # search and sorting run against the shared catalog (see form_query)
+    page_items: List[TaxForm] = []
     search_value: str = ""
     entity_filter: str = "All"
     sort_value: str = ""
@@ -33,37 +49,16 @@ class TableState(rx.State):
     limit: int = 25  # Increased to match Rails app
     preview_year: int = datetime.now().year
     show_delete_modal: bool = False
-    form_to_delete: Optional[int] = None
-
-    @rx.var(cache=True)
-    def filtered_sorted_items(self) -> List[TaxForm]:
-        items = self.items
-
-        # Filter by entity type
-        if self.entity_filter != "All":
-            items = [item for item in items if item.entity_type.lower() == self.entity_filter.lower()]
-
-        # Filter by search value
-        if self.search_value:
-            search_value = self.search_value.lower()
-            items = [
-                item
-                for item in items
-                if any(
-                    search_value in str(getattr(item, attr)).lower()
-                    for attr in ["form_number", "form_name", "entity_type", "locality_type", "locality"]
-                )
-            ]
-
-        # Sort items
-        if self.sort_value:
-            items = sorted(
-                items,
-                key=lambda item: str(getattr(item, self.sort_value)).lower(),
-                reverse=self.sort_reverse,
-            )
-
-        return items
+    form_to_delete: Optional[str] = None
+    # Keys of forms removed from this session's view by confirm_delete
+    hidden_keys: List[str] = []
+    # Bumped on every keystroke; searches started for older values are dropped
+    _search_generation: int = 0
+    # Stamp of the catalog the current page was built from (the same in
+    # every worker, so it stays meaningful if the session moves)
+    _catalog_stamp: str = ""
+    # Bumped by load_entries; older follow_catalog waits stop
+    _follow_generation: int = 0
 
     @rx.var(cache=True)
     def page_number(self) -> int:
@@ -71,38 +66,84 @@ class TableState(rx.State):
 
     @rx.var(cache=True)
     def total_pages(self) -> int:
-        filtered_count = len(self.filtered_sorted_items)
-        return (filtered_count // self.limit) + (1 if filtered_count % self.limit else 0)
-
-    @rx.var(cache=True, initial_value=[])
-    def get_current_page(self) -> list[TaxForm]:
-        start_index = self.offset
-        end_index = start_index + self.limit
-        return self.filtered_sorted_items[start_index:end_index]
+        return (self.total_items // self.limit) + (1 if self.total_items % self.limit else 0)
 
     def prev_page(self):
         if self.page_number > 1:
             self.offset -= self.limit
+            return self._load_page()
 
     def next_page(self):
         if self.page_number < self.total_pages:
             self.offset += self.limit
+            return self._load_page()
 
     def first_page(self):
         self.offset = 0
+        return self._load_page()
 
     def last_page(self):
-        self.offset = (self.total_pages - 1) * self.limit
+        self.offset = max(self.total_pages - 1, 0) * self.limit
+        return self._load_page()
+
+    def set_search_value(self, value: str):
+        """Show the new search text now and refresh the rows once typing pauses."""
+        self.search_value = value
+        self.offset = 0
+        self._search_generation += 1
+        return TableState.apply_search(self._search_generation)
+
+    @rx.event(background=True)
+    async def apply_search(self, generation: int):
+        """Run the search for a keystroke unless a newer one has superseded it."""
+        await asyncio.sleep(SEARCH_DEBOUNCE_SECONDS)
+        async with self:
+            if generation != self._search_generation:
+                return
+            snapshot = get_catalog().snapshot()
+            query = self._query(snapshot)
+
+        result = await asyncio.to_thread(run_query, snapshot, query)
+
+        async with self:
+            # The user may have kept typing while the query ran
+            if generation != self._search_generation:
+                return
+            return self._show_result(snapshot, result)
+
+    @rx.event(background=True)
+    async def read_ahead(self):
+        """Build the rows of the previous and next pages so paging is instant."""
+        async with self:
+            snapshot = get_catalog().snapshot()
+            query = self._query(snapshot)
+
+        await asyncio.to_thread(TableState._build_neighbors, snapshot, query)
+
+    def set_entity_filter(self, value: str):
+        self.entity_filter = value
+        self.offset = 0
+        return self._load_page()
+
+    def set_sort_value(self, value: str):
+        self.sort_value = value
+        self.offset = 0
+        return self._load_page()
+
+    def toggle_sort(self):
+        # Both directions are presorted, so flipping is just a different slice
+        self.sort_reverse = not self.sort_reverse
+        return self._load_page()
 
     def set_preview_year(self, value: str):
         try:
             self.preview_year = int(value)
-            self.load_entries()  # Reload with new dates
+            return self._load_page()  # Reload with new dates
         except ValueError:
             pass
 
-    def show_delete_confirmation(self, form_id: int):
-        self.form_to_delete = form_id
+    def show_delete_confirmation(self, key: str):
+        self.form_to_delete = key
         self.show_delete_modal = True
 
     def hide_delete_modal(self):
@@ -113,115 +154,122 @@ class TableState(rx.State):
         if self.form_to_delete:
             # In Rails app, this would delete from JSON
             # For now, just remove from display
-            self.items = [item for item in self.items if item.id != self.form_to_delete]
-            self.total_items = len(self.items)
+            self.hidden_keys = self.hidden_keys + [self.form_to_delete]
         self.hide_delete_modal()
+        return self._load_page()
 
     def load_entries(self):
-        """Load entries from forms.json with due date calculations."""
-        json_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "assets", "forms.json")
-        
-        try:
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-                forms_data = data.get('forms', [])
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Error loading forms.json: {e}")
-            forms_data = []
-        
-        # Convert to TaxForm objects with due date calculations
-        self.items = []
-        for i, form in enumerate(forms_data):
-            # Calculate due dates if preview_year is set
-            due_date = None
-            extension_due_date = None
-            approximated = False
-            
-            if self.preview_year:
-                dates = self._calculate_dates(form)
-                if dates:
-                    due_date = dates.get('due_date')
-                    extension_due_date = dates.get('extension_due_date')
-                    approximated = dates.get('approximated', False)
-            
-            self.items.append(
-                TaxForm(
-                    id=i + 1,
-                    form_number=form.get("formNumber", ""),
-                    form_name=form.get("formName", ""),
-                    entity_type=form.get("entityType", ""),
-                    locality_type=form.get("localityType", ""),
-                    locality=form.get("locality", ""),
-                    due_date=due_date,
-                    extension_due_date=extension_due_date,
-                    approximated=approximated
-                )
-            )
-        
-        self.total_items = len(self.items)
-
-    def _calculate_dates(self, form):
-        """Simplified due date calculation."""
-        rules = form.get('calculationRules', [])
-        if not rules:
-            return None
-        
-        # Find rule for preview year or closest
-        applicable_rule = None
-        for rule in rules:
-            if self.preview_year in rule.get('effectiveYears', []):
-                applicable_rule = rule
-                break
-        
-        # If no exact match, use first rule as approximation
-        if not applicable_rule and rules:
-            applicable_rule = rules[0]
-            approximated = True
-        else:
-            approximated = False
-        
-        if not applicable_rule:
-            return None
-        
-        # Calculate dates
-        base_date = date(self.preview_year, 12, 31)  # Year end
-        
-        due_date_info = applicable_rule.get('dueDate', {})
-        months_after = due_date_info.get('monthsAfterCalculationBase', 0)
-        day_of_month = due_date_info.get('dayOfMonth', 15)
-        
-        # Simple calculation - add months
-        month = base_date.month + months_after
-        year = base_date.year + (month - 1) // 12
-        month = ((month - 1) % 12) + 1
-        
-        try:
-            due_date = date(year, month, day_of_month).strftime('%m/%d/%Y')
-        except ValueError:
-            due_date = None
-        
-        # Extension date
-        ext_info = applicable_rule.get('extensionDueDate', {})
-        if ext_info:
-            ext_months = ext_info.get('monthsAfterCalculationBase', 0)
-            ext_day = ext_info.get('dayOfMonth', 15)
-            
-            ext_month = base_date.month + ext_months
-            ext_year = base_date.year + (ext_month - 1) // 12
-            ext_month = ((ext_month - 1) % 12) + 1
-            
-            try:
-                extension_due_date = date(ext_year, ext_month, ext_day).strftime('%m/%d/%Y')
-            except ValueError:
-                extension_due_date = None
-        else:
-            extension_due_date = None
-        
-        return {
-            'due_date': due_date,
-            'extension_due_date': extension_due_date,
-            'approximated': approximated
-        }
+        """Load the current page from the shared forms catalog with due date calculations."""
+        # Reload the catalog in the background when it changes on disk
+        watch_catalog(get_catalog())
+        self._follow_generation += 1
+        return [self._load_page(), TableState.follow_catalog(self._follow_generation)]
 
-    def toggle_sort(self):
-        self.sort_reverse = not self.sort_reverse
\ No newline at end of file
+    def refresh_catalog(self):
+        """Show catalog edits (from any session, worker or the file itself) on this page.
+
+        Indexes and cached rows carry over to a new snapshot, so only the
+        changed forms' rows are rebuilt, and nothing happens if the catalog
+        is unchanged.
+        """
+        if get_catalog().snapshot().stamp != self._catalog_stamp:
+            return self._load_page()
+
+    @rx.event(background=True)
+    async def follow_catalog(self, generation: int):
+        """Wait for the catalog watcher to report a change, then refresh this page.
+
+        One wait per open table: the server pushes the new rows when the
+        catalog changes, instead of every tab polling for it.
+        """
+        async with self:
+            if generation != self._follow_generation:
+                return
+            stamp = self._catalog_stamp
+
+        changed = await watch_catalog(get_catalog()).wait_for_change(stamp, CATALOG_FOLLOW_SECONDS)
+
+        async with self:
+            if generation != self._follow_generation:
+                return
+            # Re-armed through the browser, so a closed tab stops waiting
+            if changed and get_catalog().snapshot().stamp != self._catalog_stamp:
+                return [self._load_page(), TableState.follow_catalog(generation)]
+            return TableState.follow_catalog(generation)
+
+    def _query(self, snapshot: CatalogSnapshot) -> FormQuery:
+        # Hidden forms are kept by key, so catalog edits never hide the wrong rows
+        by_key = get_form_index(snapshot).by_key
+        hidden = frozenset(
+            position for key in self.hidden_keys for position in by_key.get(parse_form_key_id(key), [])
+        )
+        return FormQuery(
+            search=self.search_value,
+            entity_type=self.entity_filter,
+            sort_key=self.sort_value,
+            reverse=self.sort_reverse,
+            offset=self.offset,
+            limit=self.limit,
+            exclude=hidden,
+            year=self.preview_year,
+        )
+
+    def _load_page(self):
+        """Run the table query and build rows for just the forms on the page."""
+        snapshot = get_catalog().snapshot()
+        return self._show_result(snapshot, run_query(snapshot, self._query(snapshot)))
+
+    def _show_result(self, snapshot: CatalogSnapshot, result: QueryResult):
+        if not result.positions and self.offset and result.total:
+            # The page ran off the end (the catalog shrank); show the last one
+            self.offset = (result.total - 1) // self.limit * self.limit
+            result = run_query(snapshot, self._query(snapshot))
+
+        # Every assignment is sent to the browser, so only assign what changed:
+        # an edit elsewhere in the catalog costs this session nothing, and an
+        # edit on this page sends the page rather than the table
+        if result.total != self.total_items:
+            self.total_items = result.total
+        if snapshot.stamp != self._catalog_stamp:
+            self._catalog_stamp = snapshot.stamp
+        items = [TaxForm(**row) for row in self._rows(snapshot, result.positions, self.preview_year)]
+        if items != self.page_items:
+            self.page_items = items
+        # Warm the neighboring pages in the background
+        return TableState.read_ahead
+
+    @classmethod
+    def _build_neighbors(cls, snapshot: CatalogSnapshot, query: FormQuery):
+        for offset in (query.offset + query.limit, query.offset - query.limit):
+            if offset >= 0:
+                positions = run_query(snapshot, query._replace(offset=offset)).positions
+                cls._rows(snapshot, positions, query.year)
+
+    @classmethod
+    def _rows(cls, snapshot: CatalogSnapshot, positions: List[int], preview_year: int) -> List[Dict[str, Any]]:
+        """Table rows for catalog positions, computing due dates only for rows not cached."""
+        engine = get_due_date_engine(snapshot)
+        return get_row_cache(snapshot).rows(
+            positions,
+            preview_year,
+            lambda position: cls._to_row(snapshot.forms[position], position, engine, preview_year),
+        )
+
+    @classmethod
+    def _to_row(cls, form, position: int, engine: DueDateEngine, preview_year: int) -> Dict[str, Any]:
+        """Convert a catalog form to table row values with its due dates."""
+        # Calculate due dates for calendar-year coverage if preview_year is set
+        dates = engine.year_dates(position, preview_year) if preview_year else None
+
+        return dict(
+            id=position + 1,
+            key=form_key_id(form),
+            form_number=form.get("formNumber", ""),
+            form_name=form.get("formName", ""),
+            entity_type=form.get("entityType", ""),
+            locality_type=form.get("localityType", ""),
+            locality=form.get("locality", ""),
+            due_date=format_due_date(dates.due_date) if dates else None,
+            extension_due_date=format_due_date(dates.extension_due_date) if dates else None,
+            approximated=dates.approximated if dates else False
+        )
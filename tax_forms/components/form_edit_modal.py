@@ -380,6 +380,7 @@ def form_edit_modal() -> rx.Component:
                         rx.vstack(
                             rx.hstack(
                                 # rx.heading("Calculation Rules", size="4"),
+                                rx.text(FormEditState.due_date_preview, size="2", color_scheme="gray"),
                                 rx.spacer(),
                                 rx.button(
                                     rx.icon("plus", size=16),
@@ -57,7 +57,7 @@ def _show_item(item: TaxForm, index: int) -> rx.Component:
                 ),
                 rx.icon_button(
                     rx.icon("trash", size=20),
-                    on_click=lambda: TableState.show_delete_confirmation(item.id),
+                    on_click=lambda: TableState.show_delete_confirmation(item.key),
                     size="2",
                     color_scheme="red",
                     variant="soft",
@@ -67,6 +67,8 @@ def _show_item(item: TaxForm, index: int) -> rx.Component:
         ),
         style={"_hover": {"bg": hover_color}, "bg": bg_color},
         align="center",
+        # Patch rows by form rather than by position when the page changes
+        key=item.key,
     )
 
 def delete_modal() -> rx.Component:
@@ -192,6 +194,8 @@ def main_table() -> rx.Component:
                         "entity_type",
                         "locality_type",
                         "locality",
+                        "due_date",
+                        "extension_due_date",
                     ],
                     placeholder="Sort By: Form Number",
                     size="3",
@@ -203,7 +207,7 @@ def main_table() -> rx.Component:
                         rx.icon("x"),
                         justify="end",
                         cursor="pointer",
-                        on_click=TableState.setvar("search_value", ""),
+                        on_click=TableState.set_search_value(""),
                         display=rx.cond(TableState.search_value, "flex", "none"),
                     ),
                     value=TableState.search_value,
@@ -260,7 +264,7 @@ def main_table() -> rx.Component:
             ),
             rx.table.body(
                 rx.foreach(
-                    TableState.get_current_page,
+                    TableState.page_items,
                     lambda item, index: _show_item(item, index),
                 )
             ),
@@ -0,0 +1,128 @@
+# tests/test_due_date_engines.py
+"""The scalar DueDateEngine and the NumPy batch engine must give identical dates."""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from tax_forms.backend.due_date_batch import calculate_pairs, calculate_years
+from tax_forms.backend.due_date_engine import get_due_date_engine
+from tax_forms.backend.forms_catalog import CatalogSnapshot
+from tax_forms.backend.forms_store import compact_forms
+
+LOCALITIES = [
+    ("federal", "United States"),
+    ("state", "California"),
+    ("state", "New York"),
+    ("city", "New York"),
+    ("state", "Texas"),
+]
+
+
+def _offset(rng: random.Random) -> dict:
+    offset = {}
+    if rng.random() < 0.25:
+        offset["monthsAfterYearStart"] = rng.randint(0, 15)
+    else:
+        offset["monthsAfterCalculationBase"] = rng.randint(0, 15)
+    if rng.random() < 0.9:
+        # 0 and 29-31 exercise clamping to the month
+        offset["dayOfMonth"] = rng.choice([0, 1, 15, 28, 29, 30, 31, rng.randint(1, 31)])
+    return offset
+
+
+def _date_rule(rng: random.Random) -> dict:
+    date_rule = _offset(rng)
+    if rng.random() < 0.4:
+        date_rule["fiscalYearExceptions"] = {
+            f"{month:02d}": _offset(rng) for month in rng.sample(range(1, 13), rng.randint(1, 4))
+        }
+    return date_rule
+
+
+def _random_form(rng: random.Random, number: int) -> dict:
+    locality_type, locality = rng.choice(LOCALITIES)
+    rules = []
+    for _ in range(rng.randint(0, 3)):
+        rule = {"effectiveYears": rng.sample(range(2012, 2032), rng.randint(1, 4))}
+        if rng.random() < 0.9:
+            rule["dueDate"] = _date_rule(rng)
+        if rng.random() < 0.7:
+            rule["extensionDueDate"] = _date_rule(rng)
+        rules.append(rule)
+    return {
+        "formNumber": f"F{number}",
+        "entityType": "individual",
+        "localityType": locality_type,
+        "locality": locality,
+        "calculationBase": rng.choice(["end", "start"]),
+        "calculationRules": rules,
+    }
+
+
+def _snapshot(forms) -> CatalogSnapshot:
+    return CatalogSnapshot(1, compact_forms(forms))
+
+
+def _to_date(value: np.datetime64):
+    return None if np.isnat(value) else value.astype(object)
+
+
+def _assert_engines_agree(snapshot: CatalogSnapshot, positions, starts, ends):
+    engine = get_due_date_engine(snapshot)
+    batch = calculate_pairs(snapshot, positions, starts, ends)
+    for i, (position, start, end) in enumerate(zip(positions, starts, ends)):
+        dates = engine.dates(position, start, end)
+        expected = (None, None, False) if dates is None else tuple(dates)
+        got = (
+            _to_date(batch.due_dates[i]),
+            _to_date(batch.extension_due_dates[i]),
+            bool(batch.approximated[i]),
+        )
+        assert got == expected, (snapshot.forms[position], start, end)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_rules_any_year_end(seed):
+    rng = random.Random(seed)
+    snapshot = _snapshot([_random_form(rng, number) for number in range(60)])
+    positions, starts, ends = [], [], []
+    for _ in range(1500):
+        # Fiscal years ending on the last day of any month
+        year, month = rng.randint(2008, 2036), rng.randint(1, 12)
+        end = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        positions.append(rng.randrange(len(snapshot.forms)))
+        starts.append((end + timedelta(days=1)).replace(year=end.year - 1))
+        ends.append(end)
+    _assert_engines_agree(snapshot, positions, starts, ends)
+
+
+def test_calendar_years_match_table_dates():
+    rng = random.Random(42)
+    snapshot = _snapshot([_random_form(rng, number) for number in range(40)])
+    engine = get_due_date_engine(snapshot)
+    years = list(range(2010, 2034))
+    batch = calculate_years(snapshot, None, years)
+    for position in range(len(snapshot.forms)):
+        for column, year in enumerate(years):
+            dates = engine.year_dates(position, year)
+            expected = (None, None) if dates is None else (dates.due_date, dates.extension_due_date)
+            got = (_to_date(batch.due_dates[position, column]), _to_date(batch.extension_due_dates[position, column]))
+            assert got == expected
+
+
+def test_day_zero_clamps_to_first_of_month():
+    snapshot = _snapshot([{
+        "formNumber": "CL-0",
+        "entityType": "individual",
+        "localityType": "federal",
+        "locality": "United States",
+        "calculationBase": "end",
+        "calculationRules": [
+            {"effectiveYears": [2024], "dueDate": {"monthsAfterCalculationBase": 4, "dayOfMonth": 0}},
+        ],
+    }])
+    dates = get_due_date_engine(snapshot).year_dates(0, 2024)
+    assert dates.due_date == date(2025, 4, 1)
+    _assert_engines_agree(snapshot, [0], [date(2024, 1, 1)], [date(2024, 12, 31)])